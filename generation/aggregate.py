@@ -1,19 +1,44 @@
-import asyncio
+import hashlib
 import math
+from os import environ
 
 import numpy as np
 from logging import getLogger
 from tqdm.asyncio import tqdm
 
+from cache import read_similar_courses_cache, write_similar_courses_cache
 from course import Course
-from embeddings import get_model, get_embedding, get_keyword_model, CachedKeyBERT
+from embeddings import (
+    get_model,
+    get_keyword_model,
+    embed_texts,
+    KeywordExtractor,
+    EMBEDDING_BACKEND,
+    EMBEDDING_REDUCTION,
+    get_embedding_reducer,
+)
 from enrollment_data import GradeData
 from instructors import FullInstructor
 from sanitization import sanitize_instructor_id
+from similarity import (
+    EmbeddingReducer,
+    blocked_top_k,
+    quantize,
+    update_top_k,
+    TopKQuery,
+    TopKResult,
+)
 
 logger = getLogger(__name__)
 
 CROSS_LIST_MIN = 5
+# Storage precision of course embeddings in the similarity search: float32, float16 or int8
+# (float16 by default for a reduced embedding tier)
+SIMILARITY_PRECISION = environ.get("SIMILARITY_PRECISION") or (
+    "float32" if EMBEDDING_REDUCTION == "none" else "float16"
+)
+# Check the incremental similar courses update against a full recompute
+SIMILARITY_VERIFY = environ.get("SIMILARITY_VERIFY", "").strip().lower() == "true"
 
 
 def quick_statistics(
@@ -77,74 +102,220 @@ def determine_satisfies(course_ref_to_course: dict[Course.Reference, Course]):
             requisite_course.satisfies.add(course.course_reference)
 
 
-async def course_embedding_analysis(
-    course_ref_to_course: dict[Course.Reference, Course], cache_dir
-):
-    model = get_model(cache_dir)
-
-    async def embed_course(course_ref, course):
-        summary = course.get_short_summary()
-        # Wrap the synchronous get_embedding call in asyncio.to_thread if necessary.
-        embedding = await asyncio.to_thread(get_embedding, cache_dir, model, summary)
-
-        # Update progress safely using the lock.
-        return course_ref, embedding
-
-    # Create tasks for all courses.
-    tasks = [
-        embed_course(course_ref, course)
-        for course_ref, course in course_ref_to_course.items()
-    ]
-
-    # Await tasks concurrently.
-    results = await tqdm.gather(
-        *tasks, position=0, desc="Course Similarity Embedding Analysis", unit="course"
-    )
-
-    # Build the dictionary mapping course references to their embeddings.
-    course_embeddings = {course_ref: embedding for course_ref, embedding in results}
-    logger.info("Course embeddings pulled for %d courses", len(course_embeddings))
-
+def similar_courses_query(course_refs: list[Course.Reference], k: int = 5) -> TopKQuery:
+    """Top-k query of the similar courses search, restricted to allowed course numbers."""
     # --- Vectorized Nearest Neighbor Computation ---
-    # Prepare an ordered list of course references and a corresponding NumPy matrix of embeddings.
-    course_refs = list(course_embeddings.keys())
-    embeddings = np.stack([course_embeddings[ref] for ref in course_refs])
-
     # For filtering purposes, extract the course numbers.
     # (Assumes each course_ref has an attribute 'course_number'.)
     course_numbers = np.array([ref.course_number for ref in course_refs])
     # Define your filtering criteria.
     min_cc = 0
     max_cc = 1000
-    k = 5
 
     # Create a global mask: only consider courses within the [min_cc, max_cc] range.
     allowed_mask = (course_numbers >= min_cc) & (course_numbers <= max_cc)
 
-    # Compute the full similarity matrix between all courses.
+    return TopKQuery(k=k, candidate_mask=allowed_mask)
+
+
+def find_similar_courses(
+    course_refs: list[Course.Reference], embeddings: np.ndarray, k: int = 5
+):
+    """
+    Find the top k similar courses of every course from its summary embedding.
+
+    Args:
+        course_refs: Course references, aligned with the embedding rows
+        embeddings: L2-normalized course summary embeddings
+        k: Number of similar courses per course
+
+    Returns:
+        TopKResult with indices into course_refs (-1 where there are fewer than k)
+    """
+    # Find the top k similar courses in memory-bounded blocks; self similarity is excluded.
     # (Assumes the embeddings are normalized so that cosine similarity = dot product.)
-    similarity_matrix = np.dot(embeddings, embeddings.T)
-
-    # For each course, disqualify courses that do not satisfy the filter by setting their similarity to -∞.
-    similarity_matrix[:, ~allowed_mask] = -np.inf
-    # Remove self similarity by setting the diagonal to -∞.
-    np.fill_diagonal(similarity_matrix, -np.inf)
-
-    # For each row in the similarity matrix, use argpartition to get the indices of the top k similar courses.
-    top_k_indices = np.argpartition(similarity_matrix, -k, axis=1)[:, -k:]
-    # Optionally sort these indices to order by descending similarity.
-    sorted_top_k_indices = np.array(
-        [
-            indices[np.argsort(similarity_matrix[i, indices])[::-1]]
-            for i, indices in enumerate(top_k_indices)
-        ]
+    return blocked_top_k(
+        embeddings,
+        {"similar": similar_courses_query(course_refs, k)},
+        precision=SIMILARITY_PRECISION,
+    )["similar"]
+
+
+def update_similar_courses(
+    cache_dir,
+    model,
+    course_refs: list[Course.Reference],
+    summaries: list[str],
+    k=5,
+    reducer: EmbeddingReducer | None = None,
+):
+    """
+    Find the top k similar courses, reusing the previous run where summaries are unchanged.
+
+    The previous run's embedding matrix (reduced when a reducer is given,
+    stored at SIMILARITY_PRECISION) and top-k lists are kept per course, keyed
+    by the hash of its summary. Only new and changed summaries are embedded,
+    and only their similarities to every course are computed (see
+    update_top_k); courses whose neighbours changed or disappeared are searched
+    again in full. The result matches find_similar_courses up to float
+    rounding between exact ties; set SIMILARITY_VERIFY to check it.
+
+    Equally similar courses are ranked by position, so course_refs must come
+    in an order that is stable across runs (e.g. sorted by identifier).
+
+    Args:
+        cache_dir: Cache directory
+        model: Embedding model
+        course_refs: Course references
+        summaries: Short summary of each course
+        k: Number of similar courses per course
+        reducer: Reduced embedding tier to search in (see get_embedding_reducer)
+
+    Returns:
+        TopKResult with indices into course_refs (-1 where there are fewer than k)
+    """
+    identifiers = np.array([ref.get_identifier() for ref in course_refs])
+    text_hashes = np.array(
+        [hashlib.sha256(summary.encode()).hexdigest() for summary in summaries]
+    )
+
+    reduction = reducer.digest() if reducer else "none"
+
+    def embed(texts):
+        # Similarities use the reduced tier when one is configured
+        embeddings = embed_texts(cache_dir, model, texts)
+        return reducer.reduce(embeddings) if reducer else embeddings
+
+    previous = read_similar_courses_cache(cache_dir, model)
+    if previous is not None and (
+        str(previous["precision"]) != SIMILARITY_PRECISION
+        or int(previous["k"]) != k
+        or str(previous.get("reduction", "none")) != reduction
+    ):
+        logger.info("Similarity settings changed, recomputing all similar courses")
+        previous = None
+
+    if previous is None:
+        embeddings = embed(summaries)
+        top_k = find_similar_courses(course_refs, embeddings, k)
+        logger.info("Similar courses computed for all %d courses", len(course_refs))
+    else:
+        previous_rows = {
+            identifier: row
+            for row, identifier in enumerate(previous["identifiers"].tolist())
+        }
+        rows = np.array(
+            [previous_rows.get(identifier, -1) for identifier in identifiers.tolist()],
+            dtype=np.int64,
+        ).reshape(-1)
+        known = rows >= 0
+
+        changed = ~known
+        changed[known] = previous["text_hashes"][rows[known]] != text_hashes[known]
+
+        # Stored at the search precision, which quantizes them to the same values again
+        previous_embeddings = previous["embeddings"].astype(np.float32)
+        if "scales" in previous:
+            previous_embeddings *= previous["scales"][:, None]
+
+        embeddings = np.zeros(
+            (len(course_refs), previous_embeddings.shape[1]), dtype=np.float32
+        )
+        embeddings[~changed] = previous_embeddings[rows[~changed]]
+        changed_rows = np.flatnonzero(changed)
+        if len(changed_rows):
+            embeddings[changed_rows] = embed([summaries[row] for row in changed_rows])
+
+        # Previous neighbours as current rows; neighbours that are gone become -1
+        current_rows = np.full(len(previous_rows), -1, dtype=np.int64)
+        current_rows[rows[known]] = np.flatnonzero(known)
+        previous_top_k = TopKResult(
+            indices=np.full((len(course_refs), k), -1, dtype=np.int64),
+            scores=np.full((len(course_refs), k), -np.inf, dtype=np.float32),
+        )
+        previous_indices = previous["indices"][rows[known]]
+        previous_top_k.indices[known] = np.where(
+            previous_indices >= 0, current_rows[previous_indices], -1
+        )
+        previous_top_k.scores[known] = previous["scores"][rows[known]]
+        lost_neighbour = np.zeros(len(course_refs), dtype=bool)
+        lost_neighbour[known] = (
+            (previous_indices >= 0) & (previous_top_k.indices[known] < 0)
+        ).any(axis=1)
+
+        top_k, recomputed = update_top_k(
+            embeddings,
+            similar_courses_query(course_refs, k),
+            previous_top_k,
+            changed,
+            recompute=lost_neighbour,
+            precision=SIMILARITY_PRECISION,
+        )
+        logger.info(
+            "Similar courses updated: %d new or changed summaries, %d courses searched in full, %d reused",
+            len(changed_rows),
+            recomputed,
+            len(course_refs) - recomputed,
+        )
+
+    if SIMILARITY_VERIFY and previous is not None:
+        full = find_similar_courses(course_refs, embed(summaries), k)
+        mismatched = np.flatnonzero((full.indices != top_k.indices).any(axis=1))
+        if len(mismatched):
+            logger.error(
+                "Incremental similar courses differ from a full recompute for %d courses (e.g. %s), using the full result",
+                len(mismatched),
+                ", ".join(identifiers[mismatched[:5]].tolist()),
+            )
+            top_k = full
+        else:
+            logger.info("Incremental similar courses match a full recompute")
+
+    stored_embeddings, scales = quantize(embeddings, SIMILARITY_PRECISION)
+    write_similar_courses_cache(
+        cache_dir,
+        model,
+        {
+            "identifiers": identifiers,
+            "text_hashes": text_hashes,
+            "embeddings": stored_embeddings,
+            "scales": scales,
+            "indices": top_k.indices,
+            "scores": top_k.scores,
+            "precision": np.array(SIMILARITY_PRECISION),
+            "reduction": np.array(reduction),
+            "k": np.array(k),
+        },
+    )
+
+    return top_k
+
+
+def course_embedding_analysis(
+    course_ref_to_course: dict[Course.Reference, Course],
+    cache_dir,
+    embedding_backend=EMBEDDING_BACKEND,
+):
+    model = get_model(cache_dir, embedding_backend)
+
+    # Embed new or changed course summaries and update their similar courses.
+    # Sorted so ties between equally similar courses are broken the same way every run.
+    course_refs = sorted(
+        course_ref_to_course.keys(), key=lambda ref: ref.get_identifier()
+    )
+    top_k = update_similar_courses(
+        cache_dir,
+        model,
+        course_refs,
+        [course_ref_to_course[ref].get_short_summary() for ref in course_refs],
+        reducer=get_embedding_reducer(cache_dir, model, course_ref_to_course),
     )
 
     # Build a mapping from each course reference to its corresponding top k similar course references.
     similar_courses_mapping = {}
     for i, course_ref in enumerate(course_refs):
         similar_courses_mapping[course_ref] = [
-            course_refs[j] for j in sorted_top_k_indices[i]
+            course_refs[j] for j in top_k.indices[i] if j >= 0
         ]
 
     # Update each course with its similar courses.
@@ -156,37 +327,35 @@ async def course_embedding_analysis(
         ]
 
 
-async def define_keywords(
-    course_ref_to_course: dict[Course.Reference, Course], cache_dir
+def define_keywords(
+    course_ref_to_course: dict[Course.Reference, Course],
+    cache_dir,
+    embedding_backend=EMBEDDING_BACKEND,
 ):
     # Load the all-MiniLM-L6-v2 model with custom caching
-    keyword_model = get_keyword_model(cache_dir)
-    kw_model = CachedKeyBERT(cache_dir, keyword_model)
-
-    def set_keywords(course: Course):
-        description = course.description.strip()
-
-        if not description:
-            return
-
-        keywords = kw_model.extract_keywords(
-            description,
-            keyphrase_ngram_range=(1, 2),
-            stop_words="english",
-            top_n=5,
-            use_maxsum=True,
-            nr_candidates=10,
-        )
-
-        actual_keywords = [keyword[0] for keyword in keywords]
-        course.keywords = actual_keywords
+    keyword_model = get_keyword_model(cache_dir, embedding_backend)
+    extractor = KeywordExtractor(
+        cache_dir,
+        keyword_model,
+        keyphrase_ngram_range=(1, 2),
+        stop_words="english",
+        top_n=5,
+        nr_candidates=10,
+    )
 
-    tasks = [
-        asyncio.to_thread(set_keywords, course)
-        for course in course_ref_to_course.values()
+    courses = [
+        course for course in course_ref_to_course.values() if course.description.strip()
     ]
 
-    await tqdm.gather(*tasks, desc="Extracting Keywords", unit="course")
+    # Candidates and embeddings are batched over every description at once
+    keywords = extractor.extract_keywords(
+        [course.description.strip() for course in courses]
+    )
+
+    for course, course_keywords in zip(courses, keywords):
+        course.keywords = [keyword[0] for keyword in course_keywords]
+
+    logger.info("Keywords extracted for %d courses", len(courses))
 
 
 def aggregate_subject_stats(course_ref_to_course: dict[Course.Reference, Course]):
@@ -291,7 +460,10 @@ def determine_a_rate_chance(course_ref_to_course: dict[Course.Reference, Course]
 
 
 def aggregate_courses(
-    course_ref_to_course: dict[Course.Reference, Course], instructors, cache_dir
+    course_ref_to_course: dict[Course.Reference, Course],
+    instructors,
+    cache_dir,
+    embedding_backend=EMBEDDING_BACKEND,
 ):
     determine_satisfies(course_ref_to_course)
 
@@ -300,8 +472,8 @@ def aggregate_courses(
 
     qs["top_100_a_rate_chances"] = determine_a_rate_chance(course_ref_to_course)
 
-    asyncio.run(course_embedding_analysis(course_ref_to_course, cache_dir))
-    asyncio.run(define_keywords(course_ref_to_course, cache_dir))
+    course_embedding_analysis(course_ref_to_course, cache_dir, embedding_backend)
+    define_keywords(course_ref_to_course, cache_dir, embedding_backend)
 
     return qs, stats
 
@@ -0,0 +1,235 @@
+"""
+Embedding backend benchmark for the aggregate step.
+
+Embeds the cached course summaries with each backend (bypassing the embedding
+cache) and reports load time and throughput, along with the accuracy against
+the torch fp32 baseline: the mean cosine similarity of matching embeddings and
+the recall of each course's similar courses. With --workers, it instead
+reports how encoding scales across that many CPU worker processes, and with
+--reduction, the recall@k and cost of reduced embedding tiers against the
+full dimension:
+
+    uv run python benchmark_embeddings.py
+    uv run python benchmark_embeddings.py onnx onnx-int8 --limit 2000
+    uv run python benchmark_embeddings.py torch --workers 1 2 4 8
+    uv run python benchmark_embeddings.py torch --reduction pca random --dimensions 256
+
+Requires a cache with the courses step done, and the onnx extra
+(uv sync --extra onnx) for the ONNX backends.
+"""
+
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from aggregate import SIMILARITY_PRECISION, find_similar_courses
+from cache import read_course_ref_to_course_cache
+from embeddings import (
+    EMBEDDING_BACKENDS,
+    EMBEDDING_BATCH_SIZE,
+    embed_texts,
+    encode_texts,
+    get_model,
+)
+from similarity import EmbeddingReducer, quantize, recall_at_k
+
+
+def embed_with_backend(
+    cache_dir, backend: str, texts: list[str], batch_size: int
+) -> tuple[np.ndarray, float, float]:
+    """
+    Load a backend and embed texts without the embedding cache.
+
+    Args:
+        cache_dir: Cache directory holding the models
+        backend: One of EMBEDDING_BACKENDS
+        texts: Texts to embed
+        batch_size: Number of texts per forward pass
+
+    Returns:
+        Tuple of (normalized embeddings, load time in s, sentences per second)
+    """
+    start = time.perf_counter()
+    model = get_model(cache_dir, backend)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embeddings = model.encode(
+        texts, batch_size=batch_size, normalize_embeddings=True
+    ).astype(np.float32)
+    throughput = len(texts) / max(time.perf_counter() - start, 1e-9)
+
+    return embeddings, load_seconds, throughput
+
+
+def worker_scaling(
+    cache_dir, backend: str, texts: list[str], batch_size: int, worker_counts
+):
+    """
+    Report encoding throughput of a backend for each number of worker processes.
+
+    Speedups are relative to a single worker, which is always measured first.
+
+    Args:
+        cache_dir: Cache directory holding the models
+        backend: One of EMBEDDING_BACKENDS
+        texts: Texts to encode
+        batch_size: Number of texts per forward pass
+        worker_counts: Numbers of worker processes to compare
+    """
+    model = get_model(cache_dir, backend)
+    single_throughput = None
+
+    for workers in [1, *(count for count in worker_counts if count != 1)]:
+        # Start the pool (loading the model in every worker) outside the timing
+        encode_texts(cache_dir, model, texts[:workers], batch_size, workers)
+
+        start = time.perf_counter()
+        encode_texts(cache_dir, model, texts, batch_size, workers)
+        throughput = len(texts) / max(time.perf_counter() - start, 1e-9)
+        single_throughput = single_throughput or throughput
+
+        print(
+            f"{backend} with {workers} workers: {throughput:.1f} sentences/sec "
+            f"({throughput / single_throughput:.2f}x of 1 worker)"
+        )
+
+
+def reduction_recall(
+    cache_dir, backend: str, course_refs, texts: list[str], methods, dimensions, k
+):
+    """
+    Report recall@k and cost of reduced embedding tiers against the full dimension.
+
+    Reductions are fitted in memory on the embeddings of the texts, so the
+    cached reduction used by the pipeline is left untouched.
+
+    Args:
+        cache_dir: Cache directory holding the models and embeddings
+        backend: One of EMBEDDING_BACKENDS
+        course_refs: Course references, aligned with texts
+        texts: Course summaries
+        methods: Reduction methods to compare (pca, random)
+        dimensions: Number of reduced dimensions
+        k: Number of similar courses per course
+    """
+    full = embed_texts(cache_dir, get_model(cache_dir, backend), texts)
+
+    start = time.perf_counter()
+    expected = find_similar_courses(course_refs, full, k)
+    full_seconds = time.perf_counter() - start
+    full_bytes = quantize(full[:1], SIMILARITY_PRECISION)[0].nbytes
+    print(
+        f"full {full.shape[1]} dims: similar courses in {full_seconds:.2f}s, "
+        f"{full_bytes} bytes per embedding ({SIMILARITY_PRECISION})"
+    )
+
+    for method in methods:
+        reduced = EmbeddingReducer.fit(full, method, dimensions).reduce(full)
+
+        start = time.perf_counter()
+        found = find_similar_courses(course_refs, reduced, k)
+        seconds = time.perf_counter() - start
+        reduced_bytes = quantize(reduced[:1], SIMILARITY_PRECISION)[0].nbytes
+
+        print(
+            f"{method} {dimensions} dims: recall@{k} {recall_at_k(expected, found):.3f}, "
+            f"similar courses in {seconds:.2f}s ({full_seconds / max(seconds, 1e-9):.1f}x faster), "
+            f"{reduced_bytes} bytes per embedding ({full_bytes / reduced_bytes:.1f}x smaller)"
+        )
+
+
+def main():
+    parser = ArgumentParser(description="Compares embedding backends on course data.")
+    parser.add_argument(
+        "backends",
+        nargs="*",
+        default=list(EMBEDDING_BACKENDS),
+        help=f"Backends to compare against the torch baseline ({', '.join(EMBEDDING_BACKENDS)}).",
+    )
+    parser.add_argument(
+        "-c", "--cache_dir", type=str, default="./.cache", help="Cache directory."
+    )
+    parser.add_argument(
+        "--limit", type=int, help="Only embed the first n course summaries."
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=EMBEDDING_BATCH_SIZE,
+        help="Number of texts per forward pass.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        help="Compare encoding with these numbers of worker processes (and 1) instead.",
+    )
+    parser.add_argument(
+        "--reduction",
+        nargs="+",
+        choices=["pca", "random"],
+        help="Compare these reduced embedding tiers with the full dimension instead.",
+    )
+    parser.add_argument(
+        "--dimensions", type=int, default=256, help="Dimensions of the reduced tiers."
+    )
+    parser.add_argument(
+        "-k", type=int, default=5, help="Similar courses per course for recall@k."
+    )
+    args = parser.parse_args()
+
+    course_ref_to_course = read_course_ref_to_course_cache(args.cache_dir)
+    course_refs = list(course_ref_to_course.keys())[: args.limit]
+    texts = [course_ref_to_course[ref].get_short_summary() for ref in course_refs]
+    print(f"Embedding {len(texts)} course summaries")
+
+    if args.workers:
+        for backend in args.backends:
+            worker_scaling(
+                args.cache_dir, backend, texts, args.batch_size, args.workers
+            )
+        return
+
+    if args.reduction:
+        for backend in args.backends:
+            reduction_recall(
+                args.cache_dir,
+                backend,
+                course_refs,
+                texts,
+                args.reduction,
+                args.dimensions,
+                args.k,
+            )
+        return
+
+    baseline, load_seconds, baseline_throughput = embed_with_backend(
+        args.cache_dir, "torch", texts, args.batch_size
+    )
+    baseline_similar = find_similar_courses(course_refs, baseline)
+    print(
+        f"torch: loaded in {load_seconds:.1f}s, {baseline_throughput:.1f} sentences/sec"
+    )
+
+    for backend in args.backends:
+        if backend == "torch":
+            continue
+
+        embeddings, load_seconds, throughput = embed_with_backend(
+            args.cache_dir, backend, texts, args.batch_size
+        )
+        cosine = float(np.mean(np.sum(baseline * embeddings, axis=1)))
+        recall = recall_at_k(
+            baseline_similar, find_similar_courses(course_refs, embeddings)
+        )
+        print(
+            f"{backend}: loaded in {load_seconds:.1f}s, {throughput:.1f} sentences/sec "
+            f"({throughput / baseline_throughput:.2f}x), "
+            f"mean cosine to torch {cosine:.4f}, similar course recall@5 {recall:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
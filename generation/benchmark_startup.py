@@ -0,0 +1,87 @@
+"""
+Startup benchmark for the generation CLI.
+
+Runs `python -X importtime` on the given modules (main by default) in a fresh
+interpreter and reports the total import time and the slowest imports, so the
+cost of a step's imports can be checked before and after a change:
+
+    uv run python benchmark_startup.py
+    uv run python benchmark_startup.py main save embeddings --top 15
+"""
+
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+
+
+def measure_imports(module: str, runs: int) -> tuple[float, list[tuple[int, str]]]:
+    """
+    Import a module in fresh interpreters and collect -X importtime output.
+
+    Args:
+        module: Module name to import
+        runs: Number of fresh interpreters to average over
+
+    Returns:
+        Tuple of (mean total import time in ms, [(cumulative us, module)] of the last run)
+    """
+    generation_dir = os.path.dirname(os.path.abspath(__file__))
+    totals = []
+    cumulative_times = []
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=generation_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        cumulative_times = []
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if not cumulative.strip().isdigit():
+                continue
+            # Keep the indentation after the separator space, it marks nesting
+            cumulative_times.append((int(cumulative), name[1:].rstrip()))
+
+        # Top-level imports are not indented, so their cumulative times add up
+        totals.append(
+            sum(us for us, name in cumulative_times if not name.startswith(" ")) / 1000
+        )
+
+    return sum(totals) / len(totals), cumulative_times
+
+
+def main():
+    parser = ArgumentParser(description="Measures import time of generation modules.")
+    parser.add_argument(
+        "modules",
+        nargs="*",
+        default=["main"],
+        help="Modules to import, each in a fresh interpreter.",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=3, help="Fresh interpreters per module."
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of slowest imports to list."
+    )
+    args = parser.parse_args()
+
+    for module in args.modules:
+        total_ms, cumulative_times = measure_imports(module, args.runs)
+        print(f"{module}: {total_ms:.1f} ms (mean of {args.runs} runs)")
+
+        slowest = sorted(cumulative_times, reverse=True)[: args.top]
+        for us, name in slowest:
+            print(f"  {us / 1000:9.1f} ms  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
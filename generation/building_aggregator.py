@@ -4,9 +4,117 @@ Handles aggregating meeting data to buildings and calculating totals.
 """
 
 import geojson
-from shapely.geometry import Point, shape
-from typing import Dict, List, Tuple, Any
-from building_loader import buildings_gdf
+import numpy as np
+import pandas as pd
+import shapely
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, List, Tuple
+from building_loader import BuildingLoader, get_building_loader
+from meeting_processor import CoordinateTimeData, TimeWindows
+from time_series_encoder import TimeSeriesEncoder
+
+
+@dataclass
+class OccupancyCube:
+    """
+    Building occupancy for every chunk of every time window.
+
+    Built once for a whole term of date buckets; each date's buildings and
+    counts are then a slice of the cube.
+    """
+
+    buildings: np.ndarray
+    """Sorted building DataFrame indices, one per row."""
+
+    persons: np.ndarray
+    """Person counts shaped (buildings, chunks of all windows)."""
+
+    instructors: np.ndarray
+    """Instructor counts shaped (buildings, chunks of all windows)."""
+
+    presence: np.ndarray
+    """Whether each building has meetings in each window, shaped (buildings, windows)."""
+
+    time_windows: TimeWindows
+    """Time range and chunk columns of each window."""
+
+    def window(self, window: int) -> Tuple[List[int], np.ndarray, np.ndarray]:
+        """
+        Slice the buildings with meetings in a window and their counts.
+
+        Args:
+            window: Window index
+
+        Returns:
+            Tuple of (building indices, persons, instructors), where the arrays
+            are shaped (buildings, window chunks)
+        """
+        rows = np.flatnonzero(self.presence[:, window])
+        columns = self.time_windows.columns(window)
+
+        return (
+            self.buildings[rows].tolist(),
+            self.persons[rows, columns],
+            self.instructors[rows, columns],
+        )
+
+    @cached_property
+    def prefix_sums(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Cumulative person and instructor counts along the chunk axis, starting at 0."""
+        pad = ((0, 0), (1, 0))
+        return (
+            np.pad(np.cumsum(self.persons, axis=1), pad),
+            np.pad(np.cumsum(self.instructors, axis=1), pad),
+        )
+
+    def window_buckets(
+        self, window: int, chunks_per_bucket: int = None, lead_chunks: int = 0
+    ) -> Tuple[List[int], np.ndarray, np.ndarray]:
+        """
+        Average the counts of a window over coarser buckets of chunks.
+
+        Bucket sums are differences of the prefix sums, so every resolution is
+        derived from the same cumulative arrays. Buckets start lead_chunks before
+        the window so they can line up with clock boundaries; the first and last
+        buckets of a window may therefore be shorter and are averaged over the
+        chunks they actually cover.
+
+        Args:
+            window: Window index
+            chunks_per_bucket: Chunks per bucket (defaults to the whole window)
+            lead_chunks: Chunks between the first bucket's origin and the window
+                start, less than chunks_per_bucket
+
+        Returns:
+            Tuple of (building indices, persons, instructors), where the arrays
+            hold the mean counts shaped (buildings, buckets)
+        """
+        rows = np.flatnonzero(self.presence[:, window])
+        columns = self.time_windows.columns(window)
+        if chunks_per_bucket is None:
+            chunks_per_bucket = max(1, columns.stop - columns.start)
+
+        edges = np.append(
+            np.arange(
+                columns.start - lead_chunks % chunks_per_bucket,
+                columns.stop,
+                chunks_per_bucket,
+            ),
+            columns.stop,
+        )
+        edges[0] = columns.start
+        widths = np.diff(edges)
+
+        prefix_persons, prefix_instructors = self.prefix_sums
+        persons = prefix_persons[np.ix_(rows, edges)]
+        instructors = prefix_instructors[np.ix_(rows, edges)]
+
+        return (
+            self.buildings[rows].tolist(),
+            np.diff(persons, axis=1) / widths,
+            np.diff(instructors, axis=1) / widths,
+        )
 
 
 class BuildingAggregator:
@@ -21,146 +129,194 @@ class BuildingAggregator:
     ]
     BUILDING_BUFFER_DEGREES = 0.000018  # ~1 meter at 43° latitude
 
-    def __init__(self, buildings_data=None):
-        self.buildings_gdf = (
-            buildings_data if buildings_data is not None else buildings_gdf
-        )
-        self._id_to_geometry = {
-            row.get("@id", ""): row.geometry
-            for idx, row in self.buildings_gdf.iterrows()
-            if row.get("@id")
-        }
+    def __init__(self, buildings_data=None, building_loader: BuildingLoader = None):
+        self._buildings_gdf = buildings_data
+        self.building_loader = building_loader or get_building_loader()
+        self._building_properties: List[Dict] | None = None
+        self._buffered_geometries: List[Dict] | None = None
+
+    @property
+    def buildings_gdf(self):
+        """Get the buildings GeoDataFrame, loading it on first use."""
+        if self._buildings_gdf is None:
+            self._buildings_gdf = self.building_loader.buildings
+        return self._buildings_gdf
+
+    def _build_feature_cache(self) -> None:
+        """
+        Clean properties and buffer geometry once for every building.
+
+        The same buildings show up in thousands of date files, so their output
+        properties and buffered geometries are computed here rather than per file.
+        """
+        if self._building_properties is not None:
+            return
+
+        self._building_properties = []
+        self._buffered_geometries = []
+        precision = self.building_loader.coordinate_precision
+
+        for _, row in self.buildings_gdf.iterrows():
+            original_props = {
+                field: None if pd.isna(row.get(field)) else row.get(field)
+                for field in self.ESSENTIAL_BUILDING_FIELDS
+            }
+
+            self._building_properties.append(
+                self._clean_building_properties(original_props)
+            )
+            buffered = row.geometry.buffer(self.BUILDING_BUFFER_DEGREES)
+            if precision is not None:
+                # Round rather than snap, so the published numbers stay short
+                buffered = shapely.transform(
+                    buffered, lambda coords: np.round(coords, precision)
+                )
+            self._buffered_geometries.append(buffered.__geo_interface__)
 
     def aggregate_coordinate_data_to_buildings(
         self,
-        buildings_geojson: geojson.FeatureCollection,
-        coordinate_time_data: Dict,
-        total_chunks: int,
-    ) -> Dict[int, Dict[str, List[int]]]:
+        point_indices: np.ndarray,
+        building_indices: np.ndarray,
+        coordinate_time_data: CoordinateTimeData,
+        time_windows: TimeWindows,
+    ) -> OccupancyCube:
         """
         Aggregate time-chunked coordinate data to building level.
 
+        The coordinate time-series are scatter-added into building rows using
+        the point -> building containment pairs from the spatial query.
+
         Args:
-            buildings_geojson: GeoJSON of buildings found
+            point_indices: Coordinate index of each containment pair
+            building_indices: Building index of each containment pair
             coordinate_time_data: Time-chunked data by coordinate
-            total_chunks: Total number of time chunks
+            time_windows: Time range and chunk columns of each window
 
         Returns:
-            Dictionary mapping building index to time-chunked data
+            OccupancyCube with one row per building, in building index order
         """
-        building_time_data = {}
-
-        for i, feature in enumerate(buildings_geojson.features):
-            building_persons = [0] * total_chunks
-            building_instructors = [0] * total_chunks
-
-            building_geom = self._get_building_geometry(feature)
-
-            if building_geom is not None:
-                # Aggregate time-chunked data from coordinates contained in this building
-                for coord, time_data in coordinate_time_data.items():
-                    point = Point(coord[0], coord[1])
-                    if building_geom.contains(point):
-                        # Add each time chunk
-                        for chunk_idx in range(total_chunks):
-                            building_persons[chunk_idx] += time_data["persons"][
-                                chunk_idx
-                            ]
-                            building_instructors[chunk_idx] += time_data["instructors"][
-                                chunk_idx
-                            ]
-
-            building_time_data[i] = {
-                "persons": building_persons,
-                "instructors": building_instructors,
-            }
-
-        return building_time_data
+        buildings, rows = np.unique(building_indices, return_inverse=True)
+        rows = rows.reshape(-1)
+        shape = (len(buildings), time_windows.total_chunks)
+
+        building_persons = np.zeros(shape, dtype=np.int64)
+        building_instructors = np.zeros(shape, dtype=np.int64)
+        presence = np.zeros((len(buildings), len(time_windows)), dtype=bool)
+
+        np.add.at(building_persons, rows, coordinate_time_data.persons[point_indices])
+        np.add.at(
+            building_instructors,
+            rows,
+            coordinate_time_data.instructors[point_indices],
+        )
+        np.logical_or.at(presence, rows, coordinate_time_data.presence[point_indices])
+
+        return OccupancyCube(
+            buildings=buildings,
+            persons=building_persons,
+            instructors=building_instructors,
+            presence=presence,
+            time_windows=time_windows,
+        )
 
-    def clean_and_enhance_building_properties(
+    def build_building_features(
         self,
-        buildings_geojson: geojson.FeatureCollection,
-        building_time_data: Dict[int, Dict[str, List[int]]],
-        total_chunks: int,
-    ) -> None:
+        building_indices: List[int],
+        building_persons: np.ndarray,
+        building_instructors: np.ndarray,
+        encoder: TimeSeriesEncoder = None,
+        shared_geometry: bool = False,
+    ) -> List[geojson.Feature]:
         """
-        Clean building properties and add time-chunked data.
+        Build output features from the cached building properties and geometry.
 
         Args:
-            buildings_geojson: GeoJSON to modify in-place
-            building_time_data: Time-chunked data by building index
-            total_chunks: Total number of time chunks
+            building_indices: Building DataFrame indices, one per row
+            building_persons: Person counts shaped (buildings, chunks)
+            building_instructors: Instructor counts shaped (buildings, chunks)
+            encoder: Encoder for the time-chunked arrays (defaults to dense lists)
+            shared_geometry: Reference buildings by @id only, leaving their
+                properties and geometry to the shared geometry features
+
+        Returns:
+            GeoJSON features with buffered geometry and time-chunked counts
         """
-        for i, feature in enumerate(buildings_geojson.features):
-            time_data = building_time_data.get(
-                i, {"persons": [0] * total_chunks, "instructors": [0] * total_chunks}
-            )
+        if encoder is None:
+            encoder = TimeSeriesEncoder()
 
-            # Clean up properties - remove null/empty values and keep only essential fields
-            cleaned_props = self._clean_building_properties(
-                feature.get("properties", {})
-            )
+        self._build_feature_cache()
+
+        features = []
+        for row, building_idx in enumerate(building_indices):
+            properties = dict(self._building_properties[building_idx])
+
+            # Buildings without an @id can't be referenced, so they stay inline
+            inline = not shared_geometry or "@id" not in properties
+            if not inline:
+                properties = {"@id": properties["@id"]}
 
             # Add our computed time-chunked arrays
-            cleaned_props["person_counts"] = time_data["persons"]
-            cleaned_props["instructor_counts"] = time_data["instructors"]
+            properties["person_counts"] = encoder.encode(building_persons[row])
+            properties["instructor_counts"] = encoder.encode(building_instructors[row])
 
-            feature["properties"] = cleaned_props
+            feature = geojson.Feature(properties=properties)
+            if inline:
+                # Assigned after construction so geojson does not round the coordinates
+                feature["geometry"] = self._buffered_geometries[building_idx]
+            features.append(feature)
 
-    def expand_building_geometries(
-        self, buildings_geojson: geojson.FeatureCollection
-    ) -> None:
+        return features
+
+    def build_geometry_features(
+        self, building_indices: List[int]
+    ) -> List[geojson.Feature]:
         """
-        Expand building geometries by a small buffer for visualization.
+        Build the shared geometry features that occupancy features reference by @id.
 
         Args:
-            buildings_geojson: GeoJSON to modify in-place
+            building_indices: Building DataFrame indices
+
+        Returns:
+            GeoJSON features with the cleaned properties and buffered geometry
         """
-        for feature in buildings_geojson.features:
-            if "geometry" in feature:
-                geom = shape(feature["geometry"])
-                buffered_geom = geom.buffer(self.BUILDING_BUFFER_DEGREES)
-                feature["geometry"] = buffered_geom.__geo_interface__
+        self._build_feature_cache()
+
+        features = []
+        for building_idx in building_indices:
+            properties = self._building_properties[building_idx]
+            if "@id" not in properties:
+                continue
+
+            feature = geojson.Feature(properties=dict(properties))
+            feature["geometry"] = self._buffered_geometries[building_idx]
+            features.append(feature)
+
+        return features
+
+    def building_ids(self, building_indices: List[int]) -> List[str]:
+        """Get the OSM @id of each building (None when it has none)."""
+        self._build_feature_cache()
+        return [self._building_properties[idx].get("@id") for idx in building_indices]
 
     def calculate_campus_totals(
-        self, buildings_geojson: geojson.FeatureCollection, total_chunks: int
+        self, building_persons: np.ndarray, building_instructors: np.ndarray
     ) -> Tuple[List[int], List[int], int]:
         """
         Calculate campus-wide totals for each time chunk.
 
         Args:
-            buildings_geojson: GeoJSON with building data
-            total_chunks: Total number of time chunks
+            building_persons: Person counts shaped (buildings, chunks)
+            building_instructors: Instructor counts shaped (buildings, chunks)
 
         Returns:
             Tuple of (total_persons_by_chunk, total_instructors_by_chunk, max_persons)
         """
-        total_persons_by_chunk = [0] * total_chunks
-        total_instructors_by_chunk = [0] * total_chunks
-        max_persons = 0
-
-        for feature in buildings_geojson.features:
-            person_counts = feature["properties"].get("person_counts", [])
-            instructor_counts = feature["properties"].get("instructor_counts", [])
-
-            # Track max persons across all chunks
-            if person_counts:
-                max_persons = max(max_persons, max(person_counts))
-
-            # Aggregate totals for each chunk
-            for chunk_idx in range(min(len(person_counts), total_chunks)):
-                total_persons_by_chunk[chunk_idx] += person_counts[chunk_idx]
-
-            for chunk_idx in range(min(len(instructor_counts), total_chunks)):
-                total_instructors_by_chunk[chunk_idx] += instructor_counts[chunk_idx]
+        total_persons_by_chunk = building_persons.sum(axis=0).tolist()
+        total_instructors_by_chunk = building_instructors.sum(axis=0).tolist()
+        max_persons = int(building_persons.max()) if building_persons.size else 0
 
         return total_persons_by_chunk, total_instructors_by_chunk, max_persons
 
-    def _get_building_geometry(self, feature: Dict) -> Any:
-        """Get the building geometry from the original buildings dataset."""
-        building_id = feature.get("properties", {}).get("@id", "")
-        return self._id_to_geometry.get(building_id)
-
     def _clean_building_properties(self, original_props: Dict) -> Dict:
         """Clean building properties, keeping only essential non-null fields."""
         cleaned_props = {}
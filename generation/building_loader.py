@@ -3,32 +3,118 @@ Building data loading and management module.
 Handles loading OSM building data and creating spatial indexes.
 """
 
-import geopandas as gpd
+import hashlib
 import os
-from typing import Dict, Any
+import pandas as pd
+import shapely
+from typing import TYPE_CHECKING, Dict, Any
 
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+# geopandas (and its pyogrio I/O stack) is imported by the loading code only, so
+# importing this module stays cheap until a spatial query needs the buildings.
+
+_building_cache_config = {
+    "location": None,
+}
+
+
+def set_building_cache_location(location):
+    _building_cache_config["location"] = location
 
-class BuildingLoader:
-    """Manages loading and filtering of building data from OSM GeoJSON."""
 
-    def __init__(self, geojson_path: str = None):
+class BuildingLoader:
+    """
+    Manages loading and filtering of building data from OSM GeoJSON.
+
+    Buildings are loaded lazily on first access. When a cache location is set,
+    the filtered buildings are stored there keyed by the source file hash, so
+    later processes skip parsing the full OSM GeoJSON.
+
+    Polygons can optionally be simplified (topology preserving, tolerance in
+    degrees) and snapped to a grid of coordinate_precision decimal places at
+    load time; the same precision is used for the published buffered geometry.
+    """
+
+    def __init__(
+        self,
+        geojson_path: str = None,
+        cache_location: str = None,
+        simplify_tolerance: float = None,
+        coordinate_precision: int = None,
+    ):
         if geojson_path is None:
             current_dir = os.path.dirname(os.path.abspath(__file__))
             geojson_path = os.path.join(current_dir, "osm.geojson")
 
         self.geojson_path = geojson_path
+        self.cache_location = cache_location
+        self.simplify_tolerance = simplify_tolerance
+        self.coordinate_precision = coordinate_precision
         self._buildings_gdf = None
-
-    def load_buildings(self) -> gpd.GeoDataFrame:
+        self._source_hash = None
+
+    def _cache_path(self) -> str | None:
+        """Path of the filtered buildings cache for the current source file."""
+        location = self.cache_location or _building_cache_config["location"]
+        if location is None:
+            return None
+        return os.path.join(location, f"buildings_{self.data_hash}.pkl")
+
+    def _prepare_geometries(self, building_gdf: "gpd.GeoDataFrame") -> None:
+        """Simplify and quantize building polygons in place, reporting the reduction."""
+        if not self.simplify_tolerance and self.coordinate_precision is None:
+            return
+
+        import geopandas as gpd
+
+        geometries = building_gdf.geometry.values
+        vertices_before = shapely.get_num_coordinates(geometries).sum()
+        size_before = sum(len(text) for text in shapely.to_geojson(geometries))
+
+        if self.simplify_tolerance:
+            geometries = shapely.simplify(
+                geometries, self.simplify_tolerance, preserve_topology=True
+            )
+        if self.coordinate_precision is not None:
+            geometries = shapely.set_precision(
+                geometries, 10**-self.coordinate_precision
+            )
+
+        building_gdf.geometry = gpd.GeoSeries(
+            geometries, index=building_gdf.index, crs=building_gdf.crs
+        )
+
+        vertices_after = shapely.get_num_coordinates(geometries).sum()
+        size_after = sum(len(text) for text in shapely.to_geojson(geometries))
+        print(
+            f"Simplified buildings (tolerance={self.simplify_tolerance}, "
+            f"precision={self.coordinate_precision}): "
+            f"{vertices_before} -> {vertices_after} vertices "
+            f"({1 - vertices_after / max(vertices_before, 1):.1%} fewer), "
+            f"{size_before / 1024:.1f} -> {size_after / 1024:.1f} KB of GeoJSON "
+            f"({1 - size_after / max(size_before, 1):.1%} smaller)"
+        )
+
+    def load_buildings(self) -> "gpd.GeoDataFrame":
         """
         Load and filter OSM GeoJSON data to only building features.
 
         Returns:
-            GeoDataFrame with only buildings, spatially indexed for fast queries
+            GeoDataFrame with only buildings; its spatial index is built on first query
         """
         if self._buildings_gdf is not None:
             return self._buildings_gdf
 
+        cache_path = self._cache_path()
+        if cache_path and os.path.exists(cache_path):
+            self._buildings_gdf = pd.read_pickle(cache_path)
+            print(f"Loaded {len(self._buildings_gdf)} buildings from {cache_path}")
+            return self._buildings_gdf
+
+        import geopandas as gpd
+
         print("Loading building data...")
         gdf = gpd.read_file(self.geojson_path)
 
@@ -42,8 +128,14 @@ class BuildingLoader:
         # Reset index after filtering
         building_gdf.reset_index(drop=True, inplace=True)
 
+        self._prepare_geometries(building_gdf)
+
         self._buildings_gdf = building_gdf
-        print(f"Loaded {len(building_gdf)} buildings with spatial index")
+        print(f"Loaded {len(building_gdf)} buildings")
+
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            building_gdf.to_pickle(cache_path)
 
         return self._buildings_gdf
 
@@ -59,12 +151,49 @@ class BuildingLoader:
         }
 
     @property
-    def buildings(self) -> gpd.GeoDataFrame:
+    def source_hash(self) -> str:
+        """SHA-256 of the source GeoJSON, used to key derived spatial caches."""
+        if self._source_hash is None:
+            sha256 = hashlib.sha256()
+            with open(self.geojson_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha256.update(block)
+            self._source_hash = sha256.hexdigest()
+        return self._source_hash
+
+    @property
+    def data_hash(self) -> str:
+        """Hash of the source GeoJSON and geometry options, keying derived caches."""
+        if not self.simplify_tolerance and self.coordinate_precision is None:
+            return self.source_hash
+
+        options = (
+            f"{self.source_hash}:{self.simplify_tolerance}:{self.coordinate_precision}"
+        )
+        return hashlib.sha256(options.encode()).hexdigest()
+
+    @property
+    def buildings(self) -> "gpd.GeoDataFrame":
         """Get the buildings GeoDataFrame, loading if necessary."""
         if self._buildings_gdf is None:
             self.load_buildings()
         return self._buildings_gdf
 
 
-_loader = BuildingLoader()
-buildings_gdf = _loader.buildings
+_loader = BuildingLoader(
+    simplify_tolerance=(
+        float(os.environ["MAP_SIMPLIFY_TOLERANCE"])
+        if os.environ.get("MAP_SIMPLIFY_TOLERANCE")
+        else None
+    ),
+    coordinate_precision=(
+        int(os.environ["MAP_COORDINATE_PRECISION"])
+        if os.environ.get("MAP_COORDINATE_PRECISION")
+        else None
+    ),
+)
+
+
+def get_building_loader() -> BuildingLoader:
+    """Get the shared loader; buildings are only read once something queries them."""
+    return _loader
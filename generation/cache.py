@@ -146,68 +146,6 @@ def write_explorer_stats_cache(cache_dir, explorer_extras):
     write_file(cache_dir, (), "explorer_stats", explorer_extras)
 
 
-def write_embedding(
-    directory: str, directory_tuple: tuple[str, ...], filename: str, embedding
-):
-    """
-    Writes a numpy array (embedding) to an .npy file.
-
-    Parameters:
-        directory (str): Base directory.
-        directory_tuple (tuple[str, ...]): Tuple representing subdirectories.
-        filename (str): Name of the file (without the .npy extension).
-        embedding (np.ndarray): The embedding data to be saved.
-    """
-    # Create the full directory path.
-    directory_path = os.path.join(directory, *directory_tuple)
-    os.makedirs(directory_path, exist_ok=True)
-
-    # Sanitize the filename to remove problematic characters.
-    sanitized_filename = filename.replace("/", "_").replace(" ", "_")
-    file_path = os.path.join(directory_path, f"{sanitized_filename}.npy")
-
-    # Save the embedding using numpy's binary format.
-    np.save(file_path, embedding)
-
-    # Calculate file size and log it.
-    file_size = os.path.getsize(file_path)
-    readable_size = format_file_size(file_size)
-    logger.debug(f"Embedding saved to {file_path} ({readable_size})")
-
-
-def read_embedding(directory: str, directory_tuple: tuple[str, ...], filename: str):
-    """
-    Reads a numpy array (embedding) from an .npy file.
-
-    Parameters:
-        directory (str): Base directory where the embedding file is stored.
-        directory_tuple (tuple[str, ...]): Tuple representing subdirectories.
-        filename (str): Name of the file (without the .npy extension).
-
-    Returns:
-        The loaded numpy array, or None if the file does not exist.
-    """
-    # Create the full directory path.
-    directory_path = os.path.join(directory, *directory_tuple)
-
-    # Sanitize the filename.
-    sanitized_filename = filename.replace("/", "_").replace(" ", "_")
-    file_path = os.path.join(directory_path, f"{sanitized_filename}.npy")
-
-    # Check if the file exists.
-    if not os.path.exists(file_path):
-        logger.debug(f"Embedding file {file_path} does not exist.")
-        return None
-
-    try:
-        embedding = np.load(file_path)
-        logger.debug(f"Embedding read from {file_path}")
-        return embedding
-    except Exception as e:
-        logger.warning(f"Failed to load embedding from {file_path}: {e}")
-        return None
-
-
 def get_model_name_for_cache(model):
     """
     Extract a safe model name for caching purposes.
@@ -257,36 +195,266 @@ def get_model_name_for_cache(model):
     return sanitized_name
 
 
-def read_embedding_cache(cache_dir, sha256hash: str, model):
+def read_embedding_pack_cache(cache_dir, sha256hashes, model):
+    """
+    Read many cached embeddings at once.
+
+    Embeddings are read from the model's packed embedding file in a single load.
+
+    Args:
+        cache_dir: Cache directory
+        sha256hashes: Hashes of the texts
+        model: Model instance for per-model caching
+
+    Returns:
+        Mapping of hash to cached embedding for the hashes that were found
+    """
+    model_name = get_model_name_for_cache(model)
+    directory_path = os.path.join(cache_dir, "embeddings", model_name)
+    pack_path = os.path.join(directory_path, "pack.npz")
+
+    packed = {}
+    if os.path.exists(pack_path):
+        try:
+            with np.load(pack_path) as pack:
+                packed = dict(zip(pack["hashes"].tolist(), pack["embeddings"]))
+            logger.debug(f"Read {len(packed)} packed embeddings from {pack_path}")
+        except Exception as e:
+            logger.warning(f"Failed to load packed embeddings from {pack_path}: {e}")
+
+    return {
+        sha256hash: packed[sha256hash]
+        for sha256hash in sha256hashes
+        if sha256hash in packed
+    }
+
+
+def write_embedding_pack_cache(cache_dir, embeddings, model):
+    """
+    Add embeddings to the model's packed embedding file.
+
+    Args:
+        cache_dir: Cache directory
+        embeddings: Mapping of text hash to embedding
+        model: Model instance for per-model caching
+    """
+    if not embeddings:
+        return
+
+    model_name = get_model_name_for_cache(model)
+    directory_path = os.path.join(cache_dir, "embeddings", model_name)
+    os.makedirs(directory_path, exist_ok=True)
+    pack_path = os.path.join(directory_path, "pack.npz")
+
+    packed = {}
+    if os.path.exists(pack_path):
+        try:
+            with np.load(pack_path) as pack:
+                packed = dict(zip(pack["hashes"].tolist(), pack["embeddings"]))
+        except Exception as e:
+            logger.warning(f"Rewriting unreadable packed embeddings {pack_path}: {e}")
+    packed.update(embeddings)
+
+    hashes = sorted(packed)
+    # Written to a temporary file first so an interrupted run can't corrupt the pack
+    temporary_path = os.path.join(directory_path, "pack.tmp.npz")
+    np.savez(
+        temporary_path,
+        hashes=np.array(hashes),
+        embeddings=np.stack([packed[sha256hash] for sha256hash in hashes]),
+    )
+    os.replace(temporary_path, pack_path)
+
+    file_size = os.path.getsize(pack_path)
+    logger.debug(
+        f"{len(hashes)} packed embeddings saved to {pack_path} ({format_file_size(file_size)})"
+    )
+
+
+def read_keyword_cache(cache_dir, model):
+    """
+    Read every cached keyword extraction of a keyword model in one load.
+
+    Args:
+        cache_dir: Cache directory
+        model: Keyword model instance for per-model caching
+
+    Returns:
+        dict: Mapping of extraction key to [[keyword, score], ...]
+    """
+    model_name = get_model_name_for_cache(model)
+    file_path = os.path.join(cache_dir, "embeddings", model_name, "keywords.json")
+
+    if not os.path.exists(file_path):
+        return {}
+
+    try:
+        with open(file_path, "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except Exception as e:
+        logger.warning(f"Failed to load cached keywords from {file_path}: {e}")
+        return {}
+
+
+def write_keyword_cache(cache_dir, keywords, model):
+    """
+    Add keyword extractions to the keyword model's cache file.
+
+    Args:
+        cache_dir: Cache directory
+        keywords: Mapping of extraction key to [(keyword, score), ...]
+        model: Keyword model instance for per-model caching
+    """
+    if not keywords:
+        return
+
+    model_name = get_model_name_for_cache(model)
+    directory_path = os.path.join(cache_dir, "embeddings", model_name)
+    os.makedirs(directory_path, exist_ok=True)
+    file_path = os.path.join(directory_path, "keywords.json")
+
+    cached = read_keyword_cache(cache_dir, model)
+    cached.update(keywords)
+
+    # Written to a temporary file first so an interrupted run can't corrupt the cache
+    temporary_path = os.path.join(directory_path, "keywords.tmp.json")
+    with open(temporary_path, "w", encoding="utf-8") as json_file:
+        json.dump(cached, json_file, separators=(",", ":"), sort_keys=True)
+    os.replace(temporary_path, file_path)
+
+    file_size = os.path.getsize(file_path)
+    logger.debug(
+        f"{len(cached)} keyword extractions saved to {file_path} ({format_file_size(file_size)})"
+    )
+
+
+def read_embedding_reducer_cache(cache_dir, model, method, dimensions):
+    """
+    Read a fitted embedding reduction of a model.
+
+    Args:
+        cache_dir: Cache directory
+        model: Model instance for per-model caching
+        method: Reduction method (pca or random)
+        dimensions: Number of reduced dimensions
+
+    Returns:
+        dict: Arrays mean and components, or None if not fitted yet
+    """
+    model_name = get_model_name_for_cache(model)
+    file_path = os.path.join(
+        cache_dir, "embeddings", model_name, f"reducer_{method}_{dimensions}.npz"
+    )
+
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with np.load(file_path) as reducer:
+            return dict(reducer)
+    except Exception as e:
+        logger.warning(f"Failed to load embedding reduction from {file_path}: {e}")
+        return None
+
+
+def write_embedding_reducer_cache(cache_dir, model, method, dimensions, reducer):
+    """
+    Write a fitted embedding reduction of a model.
+
+    Args:
+        cache_dir: Cache directory
+        model: Model instance for per-model caching
+        method: Reduction method (pca or random)
+        dimensions: Number of reduced dimensions
+        reducer: Arrays mean and components
+    """
+    model_name = get_model_name_for_cache(model)
+    directory_path = os.path.join(cache_dir, "embeddings", model_name)
+    os.makedirs(directory_path, exist_ok=True)
+    file_path = os.path.join(directory_path, f"reducer_{method}_{dimensions}.npz")
+
+    np.savez(file_path, **reducer)
+    logger.debug(f"Embedding reduction saved to {file_path}")
+
+
+def read_similar_courses_cache(cache_dir, model):
     """
-    Read cached embedding from model-specific subdirectory.
+    Read the state of the previous similar courses search.
 
     Args:
         cache_dir: Cache directory
-        sha256hash: Hash of the text
         model: Model instance for per-model caching
 
     Returns:
-        Cached embedding or None
+        dict: Arrays of the previous run (see write_similar_courses_cache), or None
     """
     model_name = get_model_name_for_cache(model)
-    directory_tuple = ("embeddings", model_name)
-    return read_embedding(cache_dir, directory_tuple, sha256hash)
+    file_path = os.path.join(cache_dir, "embeddings", model_name, "similar_courses.npz")
+
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with np.load(file_path) as state:
+            return dict(state)
+    except Exception as e:
+        logger.warning(f"Failed to load similar courses state from {file_path}: {e}")
+        return None
 
 
-def write_embedding_cache(cache_dir, sha256hash: str, embedding, model):
+def write_similar_courses_cache(cache_dir, model, state):
     """
-    Write embedding to cache in model-specific subdirectory.
+    Write the state of the similar courses search for the next run.
 
     Args:
         cache_dir: Cache directory
-        sha256hash: Hash of the text
-        embedding: Embedding to cache
         model: Model instance for per-model caching
+        state: Arrays by name: identifiers, text_hashes, embeddings (at the
+               search precision) and their scales, indices, scores, precision,
+               reduction and k
     """
     model_name = get_model_name_for_cache(model)
-    directory_tuple = ("embeddings", model_name)
-    write_embedding(cache_dir, directory_tuple, sha256hash, embedding)
+    directory_path = os.path.join(cache_dir, "embeddings", model_name)
+    os.makedirs(directory_path, exist_ok=True)
+    file_path = os.path.join(directory_path, "similar_courses.npz")
+
+    # Written to a temporary file first so an interrupted run can't corrupt the state
+    temporary_path = os.path.join(directory_path, "similar_courses.tmp.npz")
+    np.savez(temporary_path, **state)
+    os.replace(temporary_path, file_path)
+
+    file_size = os.path.getsize(file_path)
+    logger.debug(
+        f"Similar courses state saved to {file_path} ({format_file_size(file_size)})"
+    )
+
+
+def read_optimized_prerequisites_cache(cache_dir):
+    """
+    Reads the prerequisite optimization results of the previous run.
+
+    Parameters:
+        cache_dir (str): Directory where the cache is stored.
+
+    Returns:
+        dict: Course identifier to {"key", "optimized_prerequisites", "error"}, or empty dict if not found.
+    """
+    results = read_cache(cache_dir, (), "optimized_prerequisites")
+    if results is None:
+        return {}
+
+    return results
+
+
+def write_optimized_prerequisites_cache(cache_dir, results):
+    """
+    Writes the prerequisite optimization results to the cache.
+
+    Parameters:
+        cache_dir (str): Directory where the cache is stored.
+        results (dict): Course identifier to {"key", "optimized_prerequisites", "error"}.
+    """
+    write_file(cache_dir, (), "optimized_prerequisites", results)
 
 
 def write_new_terms_cache(cache_dir, new_terms):
@@ -340,3 +508,67 @@ def read_course_ref_to_meetings_cache(cache_dir):
         ]
         for key, value in course_to_meetings.items()
     }
+
+
+def read_building_lookup_cache(cache_dir, building_data_hash: str):
+    """
+    Reads the coordinate to building lookup table from the cache.
+
+    Parameters:
+        cache_dir (str): Directory where the cache is stored.
+        building_data_hash (str): Hash of the building source data the table was built from.
+
+    Returns:
+        dict: Mapping of "lon,lat" keys to building indices, or empty dict if not found.
+    """
+    lookup = read_cache(
+        cache_dir, ("spatial",), f"building_lookup_{building_data_hash}"
+    )
+    if lookup is None:
+        return {}
+    return lookup
+
+
+def write_building_lookup_cache(cache_dir, building_data_hash: str, lookup):
+    """
+    Writes the coordinate to building lookup table to the cache.
+
+    Parameters:
+        cache_dir (str): Directory where the cache is stored.
+        building_data_hash (str): Hash of the building source data the table was built from.
+        lookup (dict): Mapping of "lon,lat" keys to building indices.
+    """
+    write_file(cache_dir, ("spatial",), f"building_lookup_{building_data_hash}", lookup)
+
+
+def read_building_name_cache(cache_dir, building_data_hash: str):
+    """
+    Reads the building name to OSM @id table from the cache.
+
+    Parameters:
+        cache_dir (str): Directory where the cache is stored.
+        building_data_hash (str): Hash of the building source data the table was built from.
+
+    Returns:
+        dict: Mapping of building names to OSM @ids (None if unresolved), or empty dict if not found.
+    """
+    name_table = read_cache(
+        cache_dir, ("spatial",), f"building_names_{building_data_hash}"
+    )
+    if name_table is None:
+        return {}
+    return name_table
+
+
+def write_building_name_cache(cache_dir, building_data_hash: str, name_table):
+    """
+    Writes the building name to OSM @id table to the cache.
+
+    Parameters:
+        cache_dir (str): Directory where the cache is stored.
+        building_data_hash (str): Hash of the building source data the table was built from.
+        name_table (dict): Mapping of building names to OSM @ids (None if unresolved).
+    """
+    write_file(
+        cache_dir, ("spatial",), f"building_names_{building_data_hash}", name_table
+    )
@@ -1,306 +1,795 @@
 import asyncio
+import atexit
 import hashlib
+import itertools
+import multiprocessing
 import os
+import platform
 import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 from logging import getLogger
 from os import environ
 
 import numpy as np
 import requests_cache
 from sentence_transformers import SentenceTransformer
+import torch
 from torch import cuda
 from tqdm.asyncio import tqdm
 
-from cache import read_embedding_cache, write_embedding_cache
+from cache import (
+    get_model_name_for_cache,
+    read_keyword_cache,
+    write_keyword_cache,
+    read_embedding_reducer_cache,
+    write_embedding_reducer_cache,
+    read_embedding_pack_cache,
+    write_embedding_pack_cache,
+    read_optimized_prerequisites_cache,
+    write_optimized_prerequisites_cache,
+)
 from course import Course
+from requirement_ast import BranchSearchStats
+from similarity import EmbeddingReducer
 
 logger = getLogger(__name__)
 
+EMBEDDING_BATCH_SIZE = 32
+# Maximum number of prerequisite branches kept for any requirement subtree
+BRANCH_BEAM_WIDTH = 64
+# Optional reduced embedding tier for similarity and branch scoring: none, pca or random
+EMBEDDING_REDUCTION = environ.get("EMBEDDING_REDUCTION", "none")
+EMBEDDING_REDUCED_DIMENSIONS = int(environ.get("EMBEDDING_REDUCED_DIMENSIONS", "256"))
 
-class CachedKeyBERT:
+
+class KeywordExtractor:
     """
-    Custom KeyBERT wrapper that uses our embedding caching system.
+    Batched KeyBERT-style keyword extraction with MaxSum diversification.
+
+    Candidate n-grams are extracted for the whole corpus up front, and the
+    documents and unique candidates are embedded in large batches through
+    embed_texts. MaxSum then runs per document on the in-memory vectors, so the
+    model is never patched and nothing is shared between threads.
+
+    A document's keywords only depend on the document itself, so they are
+    cached by model, extraction parameters and document hash, and documents
+    seen before skip extraction entirely.
     """
 
-    def __init__(self, cache_dir, model):
-        from keybert import KeyBERT
+    def __init__(
+        self,
+        cache_dir,
+        model: SentenceTransformer,
+        keyphrase_ngram_range: tuple[int, int] = (1, 2),
+        stop_words: str | None = "english",
+        top_n: int = 5,
+        nr_candidates: int = 10,
+    ):
+        if nr_candidates < top_n:
+            raise ValueError("nr_candidates must be at least top_n")
 
         self.cache_dir = cache_dir
         self.model = model
-        # Create KeyBERT with our custom model
-        self.keybert = KeyBERT(model=model)
+        self.keyphrase_ngram_range = keyphrase_ngram_range
+        self.stop_words = stop_words
+        self.top_n = top_n
+        self.nr_candidates = nr_candidates
+
+    def cache_key(self, doc: str) -> str:
+        """Key of a document's keywords under the current extraction parameters."""
+        parameters = (
+            f"{self.keyphrase_ngram_range}|{self.stop_words}|"
+            f"{self.top_n}|{self.nr_candidates}|maxsum"
+        )
+        parameters_hash = hashlib.sha256(parameters.encode()).hexdigest()[:16]
+        return f"{parameters_hash}:{hashlib.sha256(doc.encode()).hexdigest()}"
 
-    def extract_keywords(self, docs, **kwargs):
+    def extract_keywords(self, docs: list[str]) -> list[list[tuple[str, float]]]:
         """
-        Extract keywords using KeyBERT but with cached embeddings.
-        This method intercepts KeyBERT's internal embedding calls.
+        Extract keywords for every document, reusing cached extractions.
+
+        Args:
+            docs: Documents to extract keywords from
+
+        Returns:
+            (keyword, similarity to the document) pairs per document; empty when
+            a document has fewer than top_n candidates
         """
-        # Store original encode method
-        original_encode = self.model.encode
+        keys = [self.cache_key(doc) for doc in docs]
+        cached = read_keyword_cache(self.cache_dir, self.model)
+
+        missing = list(dict.fromkeys(key for key in keys if key not in cached))
+        hits = len(docs) - sum(key not in cached for key in keys)
+        logger.info(
+            f"Keyword cache: {hits} hits, {len(docs) - hits} misses "
+            f"({hits / max(len(docs), 1):.1%} hit rate)"
+        )
 
-        def cached_encode(sentences, **encode_kwargs):
-            # If it's a single string, convert to list
-            if isinstance(sentences, str):
-                sentences = [sentences]
-                single_input = True
-            else:
-                single_input = False
+        if missing:
+            key_to_doc = dict(zip(keys, docs))
+            extracted = dict(
+                zip(missing, self._extract([key_to_doc[key] for key in missing]))
+            )
+            write_keyword_cache(self.cache_dir, extracted, self.model)
+            cached.update(extracted)
 
-            # Get cached embeddings for each sentence
-            embeddings = []
-            for sentence in sentences:
-                sha256 = hashlib.sha256(sentence.encode()).hexdigest()
+        return [[(keyword, score) for keyword, score in cached[key]] for key in keys]
 
-                # Check if the embedding already exists (with model-specific caching)
-                embedding = read_embedding_cache(self.cache_dir, sha256, self.model)
+    def _extract(self, docs: list[str]) -> list[list[tuple[str, float]]]:
+        """Extract keywords for every document without the cache."""
+        from sklearn.feature_extraction.text import CountVectorizer
 
-                if embedding is None:
-                    # Use original encode method to avoid recursion
-                    embedding = original_encode(sentence, show_progress_bar=False)
-                    logger.debug(
-                        f"Embedding for '{sentence}' not found in cache. Caching it now."
-                    )
-                    write_embedding_cache(self.cache_dir, sha256, embedding, self.model)
+        try:
+            vectorizer = CountVectorizer(
+                ngram_range=self.keyphrase_ngram_range, stop_words=self.stop_words
+            ).fit(docs)
+        except ValueError:
+            # No candidate n-grams in any document
+            return [[] for _ in docs]
+
+        words = vectorizer.get_feature_names_out()
+        document_terms = vectorizer.transform(docs)
+
+        doc_embeddings = embed_texts(self.cache_dir, self.model, docs)
+        word_embeddings = embed_texts(self.cache_dir, self.model, words.tolist())
+
+        return [
+            self._max_sum(
+                doc_embeddings[i],
+                word_embeddings,
+                words,
+                document_terms[i].nonzero()[1],
+            )
+            for i in range(len(docs))
+        ]
+
+    def _max_sum(
+        self,
+        doc_embedding: np.ndarray,
+        word_embeddings: np.ndarray,
+        words: np.ndarray,
+        candidate_indices: np.ndarray,
+    ) -> list[tuple[str, float]]:
+        """Pick the top_n least similar candidates among the most document-like ones."""
+        if self.top_n > len(candidate_indices):
+            return []
+
+        # Embeddings are normalized, so dot products are cosine similarities
+        candidate_embeddings = word_embeddings[candidate_indices]
+        distances = candidate_embeddings @ doc_embedding
+
+        words_idx = distances.argsort()[-self.nr_candidates :]
+        candidate_similarities = (
+            candidate_embeddings[words_idx] @ candidate_embeddings[words_idx].T
+        )
 
-                embeddings.append(embedding)
+        # Sum of pairwise similarities of every combination, excluding i == j
+        combinations = np.array(
+            list(itertools.combinations(range(len(words_idx)), self.top_n))
+        )
+        pairwise = candidate_similarities[
+            combinations[:, :, None], combinations[:, None, :]
+        ].sum(axis=(1, 2))
+        pairwise -= candidate_similarities[combinations, combinations].sum(axis=1)
+        best = combinations[np.argmin(pairwise)]
+
+        return [
+            (
+                str(words[candidate_indices[words_idx[idx]]]),
+                round(float(distances[words_idx[idx]]), 4),
+            )
+            for idx in best
+        ]
 
-            embeddings = np.array(embeddings)
 
-            # Return single embedding if input was single string
-            if single_input:
-                return embeddings[0]
-            return embeddings
+# Inference backends: torch, onnx (exported fp32 graph) or onnx-int8 (dynamically quantized)
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = environ.get("EMBEDDING_BACKEND", "torch")
 
-        # Temporarily replace the model's encode method
-        self.model.encode = cached_encode
+EMBEDDING_MODEL = "avsolatorio/GIST-large-Embedding-v0"
+KEYWORD_MODEL = "all-MiniLM-L6-v2"
+# Extra SentenceTransformer arguments of models that need them
+MODEL_KWARGS = {EMBEDDING_MODEL: {"trust_remote_code": True}}
+
+
+def _onnx_quantization_config() -> str:
+    """Pick the dynamic quantization config matching the CPU instruction set."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    return "avx2"
 
-        try:
-            # Call KeyBERT with our cached encoding
-            result = self.keybert.extract_keywords(docs, **kwargs)
-        finally:
-            # Restore original encode method
-            self.model.encode = original_encode
 
-        return result
+def _load_onnx_model(
+    model_cache_dir, model_name, device, quantize, **kwargs
+) -> SentenceTransformer:
+    """
+    Load an ONNX export of a model, exporting and quantizing it on first use.
 
+    Exports are kept under <model cache>/onnx/<model name>, so only the first
+    run pays for the export. Requires the onnx extra of sentence-transformers.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
 
-initialized_model = None
+    export_dir = os.path.join(model_cache_dir, "onnx", model_name.replace("/", "_"))
 
+    if not os.path.isdir(export_dir):
+        logger.info(f"Exporting {model_name} to ONNX in {export_dir}...")
+        exported = SentenceTransformer(
+            model_name_or_path=model_name,
+            cache_folder=model_cache_dir,
+            device=device,
+            backend="onnx",
+            **kwargs,
+        )
+        # Save to a temporary directory first so an interrupted export is redone
+        partial_dir = f"{export_dir}.partial"
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        exported.save_pretrained(partial_dir)
+        os.replace(partial_dir, export_dir)
+
+    model_kwargs = {}
+    if quantize:
+        quantization_config = _onnx_quantization_config()
+        file_name = f"onnx/model_qint8_{quantization_config}.onnx"
+
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            logger.info(f"Quantizing {model_name} to int8 ({quantization_config})...")
+            export_dynamic_quantized_onnx_model(
+                SentenceTransformer(
+                    export_dir, device=device, backend="onnx", **kwargs
+                ),
+                quantization_config=quantization_config,
+                model_name_or_path=export_dir,
+            )
 
-def get_model(cache_dir):
-    global initialized_model
+        model_kwargs["file_name"] = file_name
 
-    if initialized_model:
-        logger.info("Model already loaded. Reusing the existing model.")
-        return initialized_model
+    return SentenceTransformer(
+        export_dir,
+        device=device,
+        backend="onnx",
+        model_kwargs=model_kwargs,
+        **kwargs,
+    )
 
-    # Disable HTTP request caching to ensure the model is fetched or initialized correctly.
-    with requests_cache.disabled():
-        model_cache_dir = os.path.join(cache_dir, "model")
 
-        device = "cpu"
+def load_model(
+    cache_dir, model_name, device, backend=EMBEDDING_BACKEND, **kwargs
+) -> SentenceTransformer:
+    """
+    Load a sentence-transformers model with the given inference backend.
 
-        if cuda.is_available():
-            logger.info("CUDA is available. Using GPU for model inference.")
-            cuda_device = 0
+    Args:
+        cache_dir: Cache directory (models are kept under <cache_dir>/model)
+        model_name: Hugging Face model name
+        device: Device to run the model on
+        backend: One of EMBEDDING_BACKENDS
+        **kwargs: Extra arguments for SentenceTransformer
 
-            selected_cuda_device = environ.get("CUDA_DEVICE", None)
-            if selected_cuda_device:
-                cuda_device = selected_cuda_device
-                logger.info(f"CUDA device selected: {selected_cuda_device}")
-            else:
-                logger.info(
-                    f"No specific CUDA device selected. Using default device {cuda_device}."
-                )
+    Returns:
+        The loaded model
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}"
+        )
 
-            device = f"cuda:{cuda_device}"
+    model_cache_dir = os.path.join(cache_dir, "model")
 
-        logger.info("Loading model...")
-        model = SentenceTransformer(
-            model_name_or_path="avsolatorio/GIST-large-Embedding-v0",
+    if backend == "torch":
+        return SentenceTransformer(
+            model_name_or_path=model_name,
             cache_folder=model_cache_dir,
-            trust_remote_code=True,
             device=device,
+            **kwargs,
         )
 
-        initialized_model = model
+    model = _load_onnx_model(
+        model_cache_dir, model_name, device, quantize=backend == "onnx-int8", **kwargs
+    )
+    # Embeddings differ slightly between backends, so each gets its own cache
+    model.model_name = f"{model_name}-{backend}"
+    return model
+
+
+def select_device() -> str:
+    """Pick the CUDA device when available (CUDA_DEVICE selects which), else the CPU."""
+    if not cuda.is_available():
+        return "cpu"
+
+    return f"cuda:{environ.get('CUDA_DEVICE', None) or 0}"
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, memoized models keyed by (model name, device, backend).
+
+    Loads run on a background thread, so a model can be pre-warmed while a
+    step does its I/O and only be waited on when it is first needed. Each
+    model is loaded once no matter how many callers ask for it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="model-load"
+        )
+        self._models: dict[tuple[str, str, str], Future] = {}
+        # Load time of each model that finished loading
+        self.load_seconds: dict[tuple[str, str, str], float] = {}
+
+    def _load(self, key: tuple[str, str, str], cache_dir) -> SentenceTransformer:
+        model_name, device, backend = key
+        logger.info(f"Loading {model_name} ({backend} backend on {device})...")
+
+        start = time.perf_counter()
+        # Disable HTTP request caching to ensure the model is fetched or initialized correctly.
+        with requests_cache.disabled():
+            model = load_model(
+                cache_dir,
+                model_name,
+                device,
+                backend,
+                **MODEL_KWARGS.get(model_name, {}),
+            )
+
+        self.load_seconds[key] = time.perf_counter() - start
+        logger.info(f"Loaded {model_name} in {self.load_seconds[key]:.1f}s")
         return model
 
+    def prewarm(self, cache_dir, model_name, backend=EMBEDDING_BACKEND) -> Future:
+        """
+        Start loading a model in the background unless it is loaded or loading.
+
+        Returns:
+            Future resolving to the model
+        """
+        key = (model_name, select_device(), backend)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self._executor.submit(self._load, key, cache_dir)
+            return self._models[key]
+
+    def key_of(self, model: SentenceTransformer) -> tuple[str, str, str] | None:
+        """Find the (model name, device, backend) key of a loaded model."""
+        with self._lock:
+            for key, future in self._models.items():
+                if (
+                    future.done()
+                    and not future.exception()
+                    and future.result() is model
+                ):
+                    return key
+        return None
+
+    def get(
+        self, cache_dir, model_name, backend=EMBEDDING_BACKEND
+    ) -> SentenceTransformer:
+        """Get a model, loading it or waiting for its pre-warm to finish."""
+        future = self.prewarm(cache_dir, model_name, backend)
+
+        if not future.done():
+            start = time.perf_counter()
+            model = future.result()
+            logger.info(
+                f"Waited {time.perf_counter() - start:.1f}s for {model_name} to load"
+            )
+            return model
+
+        return future.result()
+
+
+model_registry = ModelRegistry()
 
-def get_keyword_model(cache_dir):
+
+def prewarm_models(cache_dir, backend=EMBEDDING_BACKEND, keyword_model=True):
+    """Start loading the embedding (and keyword) models in the background."""
+    model_registry.prewarm(cache_dir, EMBEDDING_MODEL, backend)
+    if keyword_model:
+        model_registry.prewarm(cache_dir, KEYWORD_MODEL, backend)
+
+
+def get_model(cache_dir, backend=EMBEDDING_BACKEND):
+    return model_registry.get(cache_dir, EMBEDDING_MODEL, backend)
+
+
+def get_keyword_model(cache_dir, backend=EMBEDDING_BACKEND):
     """
     Load the all-MiniLM-L6-v2 model for keyword extraction with custom caching.
     """
-    # Disable HTTP request caching to ensure the model is fetched or initialized correctly.
-    with requests_cache.disabled():
-        model_cache_dir = os.path.join(cache_dir, "model")
+    return model_registry.get(cache_dir, KEYWORD_MODEL, backend)
 
-        device = "cpu"
 
-        if cuda.is_available():
-            logger.info("CUDA is available. Using GPU for keyword model inference.")
-            cuda_device = 0
+# Worker processes that encode texts on the CPU (1 encodes in this process)
+EMBEDDING_WORKERS = int(environ.get("EMBEDDING_WORKERS", "1"))
 
-            selected_cuda_device = environ.get("CUDA_DEVICE", None)
-            if selected_cuda_device:
-                cuda_device = selected_cuda_device
-                logger.info(f"CUDA device selected: {selected_cuda_device}")
-            else:
-                logger.info(
-                    f"No specific CUDA device selected. Using default device {cuda_device}."
-                )
+# Pools of embedding worker processes by (model key, cache directory, workers)
+_embedding_pools: dict[tuple, ProcessPoolExecutor] = {}
+# Model of an embedding worker process, loaded once by its initializer
+_worker_model = None
 
-            device = f"cuda:{cuda_device}"
 
-        logger.info("Loading keyword extraction model...")
-        model = SentenceTransformer(
-            model_name_or_path="all-MiniLM-L6-v2",
-            cache_folder=model_cache_dir,
-            device=device,
+def _init_embedding_worker(cache_dir, model_key, torch_threads):
+    global _worker_model
+
+    model_name, device, backend = model_key
+    # Split the cores between the workers instead of every worker using all of them
+    torch.set_num_threads(torch_threads)
+    with requests_cache.disabled():
+        _worker_model = load_model(
+            cache_dir, model_name, device, backend, **MODEL_KWARGS.get(model_name, {})
         )
 
-        return model
 
+def _encode_shard(shared_name, shape, rows, texts, batch_size):
+    """Encode a shard of texts into its rows of the shared output matrix."""
+    shared = SharedMemory(name=shared_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float32, buffer=shared.buf)
+        output[rows] = _worker_model.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True
+        )
+    finally:
+        shared.close()
 
-def get_embedding(cache_dir, model: SentenceTransformer, text):
-    sha256 = hashlib.sha256(text.encode()).hexdigest()
 
-    # Check if the embedding already exists (with model-specific caching)
-    embedding = read_embedding_cache(cache_dir, sha256, model)
+def shutdown_embedding_pools():
+    """Stop the embedding worker processes, cancelling any shards not yet started."""
+    while _embedding_pools:
+        _, pool = _embedding_pools.popitem()
+        pool.shutdown(wait=True, cancel_futures=True)
 
-    if embedding is None:
-        embedding = model.encode(text, show_progress_bar=False)
 
-        logger.debug(f"Embedding for '{text}' not found in cache. Caching it now.")
-        write_embedding_cache(cache_dir, sha256, embedding, model)
+# Worker pools are kept for the whole run, so later steps reuse the loaded models
+atexit.register(shutdown_embedding_pools)
 
-    return embedding
 
+def _embedding_pool(cache_dir, model_key, workers) -> ProcessPoolExecutor:
+    """Get the worker pool of a model, starting it on first use."""
+    pool_key = (model_key, cache_dir, workers)
+    if pool_key not in _embedding_pools:
+        logger.info(f"Starting {workers} embedding workers for {model_key[0]}...")
+        _embedding_pools[pool_key] = ProcessPoolExecutor(
+            max_workers=workers,
+            # Forking a process with running torch threads is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_embedding_worker,
+            initargs=(cache_dir, model_key, max(1, (os.cpu_count() or 1) // workers)),
+        )
+    return _embedding_pools[pool_key]
 
-def normalize(v):
-    return v / np.linalg.norm(v)
+
+def encode_texts(
+    cache_dir,
+    model: SentenceTransformer,
+    texts: list[str],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    workers: int = EMBEDDING_WORKERS,
+) -> np.ndarray:
+    """
+    Encode texts without the embedding cache, optionally sharded across processes.
+
+    With more than one worker, texts are dealt to the workers by length so
+    every shard pads alike, and each worker (holding its own copy of the model)
+    writes its rows straight into a shared memory matrix. Sharding only applies
+    to CPU inference of registry models; anything else encodes in this process.
+
+    Args:
+        cache_dir: Cache directory holding the models
+        model: Embedding model
+        texts: Texts to encode
+        batch_size: Number of texts per forward pass
+        workers: Number of worker processes
+
+    Returns:
+        Matrix of L2-normalized embeddings, one row per text in input order
+    """
+    model_key = model_registry.key_of(model)
+    if workers <= 1 or len(texts) < workers or not model_key or model_key[1] != "cpu":
+        return np.asarray(
+            model.encode(
+                texts,
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                show_progress_bar=True,
+            ),
+            dtype=np.float32,
+        )
+
+    shape = (len(texts), model.get_sentence_embedding_dimension())
+    shared = SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+    try:
+        by_length = np.argsort([len(text) for text in texts], kind="stable")
+        pool = _embedding_pool(cache_dir, model_key, workers)
+        shards = [
+            pool.submit(
+                _encode_shard,
+                shared.name,
+                shape,
+                rows,
+                [texts[row] for row in rows],
+                batch_size,
+            )
+            for rows in (by_length[worker::workers] for worker in range(workers))
+        ]
+        for shard in tqdm(shards, desc="Embedding shards", unit="shard"):
+            shard.result()
+
+        return np.ndarray(shape, dtype=np.float32, buffer=shared.buf).copy()
+    finally:
+        shared.close()
+        shared.unlink()
 
 
-def cosine_similarity(vec_a, vec_b):
+def embed_texts(
+    cache_dir,
+    model: SentenceTransformer,
+    texts: list[str],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+) -> np.ndarray:
     """
-    Computes the cosine similarity between two vectors.
+    Embed many texts in one batch stage.
+
+    Cached embeddings are read in one pass, and all misses are encoded together
+    in batches (sentence-transformers sorts them by length, so each batch pads
+    to similar lengths). New embeddings are added to the packed cache.
+
+    Args:
+        cache_dir: Cache directory
+        model: Embedding model
+        texts: Texts to embed
+        batch_size: Number of texts per forward pass
+
+    Returns:
+        Matrix of L2-normalized embeddings, one row per text in input order
     """
-    return np.dot(vec_a, vec_b) / (np.linalg.norm(vec_a) * np.linalg.norm(vec_b))
+    hashes = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+    cached = read_embedding_pack_cache(cache_dir, set(hashes), model)
+
+    missing = {}
+    for sha256, text in zip(hashes, texts):
+        if sha256 not in cached:
+            missing[sha256] = text
+
+    if missing:
+        start = time.perf_counter()
+        encoded = encode_texts(cache_dir, model, list(missing.values()), batch_size)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Embedded {len(missing)} texts in {elapsed:.1f}s "
+            f"({len(missing) / max(elapsed, 1e-9):.1f} sentences/sec, batch size {batch_size})"
+        )
+
+        cached.update(zip(missing.keys(), encoded))
 
+    # Pack new embeddings for a single read next time
+    write_embedding_pack_cache(
+        cache_dir, {sha256: cached[sha256] for sha256 in missing}, model
+    )
+
+    logger.info(
+        f"Embeddings for {len(texts)} texts: {len(texts) - len(missing)} cached, {len(missing)} encoded"
+    )
 
-def average_embedding(embeddings):
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    embeddings = np.stack([cached[sha256] for sha256 in hashes]).astype(np.float32)
+    # Packs written before encoding normalized its output hold unnormalized embeddings
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def read_embedding_reducer(cache_dir, model) -> EmbeddingReducer | None:
+    """Get the configured embedding reduction of a model if it was fitted before."""
+    if EMBEDDING_REDUCTION == "none":
+        return None
+
+    reducer = read_embedding_reducer_cache(
+        cache_dir, model, EMBEDDING_REDUCTION, EMBEDDING_REDUCED_DIMENSIONS
+    )
+    if reducer is None:
+        return None
+    return EmbeddingReducer(EMBEDDING_REDUCTION, reducer["mean"], reducer["components"])
+
+
+def get_embedding_reducer(
+    cache_dir, model, course_ref_to_course: dict[Course.Reference, Course]
+) -> EmbeddingReducer | None:
     """
-    Computes the average of a list of embeddings.
+    Get the configured embedding reduction of a model, fitting it on first use.
+
+    The reduction is fitted once per model, always on the short summaries of
+    every course (whichever step needs it first), and cached, so every step
+    projects into the same space. Results computed in the reduced space are
+    keyed by EmbeddingReducer.digest, so a refitted projection invalidates them.
+
+    Args:
+        cache_dir: Cache directory
+        model: Embedding model
+        course_ref_to_course: Courses whose short summaries to fit on if the
+            reduction is not cached
+
+    Returns:
+        The reducer, or None when EMBEDDING_REDUCTION is none
     """
-    if not embeddings:
+    if EMBEDDING_REDUCTION == "none":
         return None
-    return np.mean(embeddings, axis=0)
+
+    reducer = read_embedding_reducer(cache_dir, model)
+    if reducer is None:
+        course_refs = sorted(
+            course_ref_to_course.keys(), key=lambda ref: ref.get_identifier()
+        )
+        embeddings = embed_texts(
+            cache_dir,
+            model,
+            [course_ref_to_course[ref].get_short_summary() for ref in course_refs],
+        )
+        reducer = EmbeddingReducer.fit(
+            embeddings, EMBEDDING_REDUCTION, EMBEDDING_REDUCED_DIMENSIONS
+        )
+        write_embedding_reducer_cache(
+            cache_dir,
+            model,
+            EMBEDDING_REDUCTION,
+            EMBEDDING_REDUCED_DIMENSIONS,
+            {"mean": reducer.mean, "components": reducer.components},
+        )
+        logger.info(
+            f"Fitted {EMBEDDING_REDUCTION} reduction of {embeddings.shape[1]}-dim embeddings "
+            f"to {reducer.dimensions} dimensions on {len(embeddings)} short summaries"
+        )
+
+    return reducer
 
 
 def find_best_prerequisite(
-    cache_dir, model, course: Course, prerequisites, max_prerequisites
+    course: Course, prerequisites, branch_scorer, max_prerequisites
 ) -> list[Course]:
     prerequisite_text = course.prerequisites.prerequisites_text
     and_count = len(re.findall(r"\d*and\d*", prerequisite_text))
     max_prerequisites += and_count
 
-    course_embedding = get_embedding(cache_dir, model, course.get_full_summary())
-    prerequisite_embeddings = [
-        (prereq, get_embedding(cache_dir, model, prereq.get_short_summary()))
-        for prereq in prerequisites
-    ]
+    # Sorted first so equally similar prerequisites keep a stable order
+    prerequisites = sorted(prerequisites, key=lambda prereq: prereq.get_identifier())
+    similarities = branch_scorer.similarities(
+        course, [prereq.course_reference for prereq in prerequisites]
+    )
 
-    similarities = [
-        (prereq, cosine_similarity(course_embedding, prereq_embedding))
-        for prereq, prereq_embedding in prerequisite_embeddings
-    ]
+    # Find the prerequisites with the highest similarity score
+    best_prerequisites = np.argsort(-similarities, kind="stable")[:max_prerequisites]
 
-    # Find the prerequisite with the highest similarity score
-    best_prerequisite = sorted(similarities, key=lambda x: x[1], reverse=True)[
-        :max_prerequisites
-    ]
+    # Return the course objects of the best prerequisites
+    return [prerequisites[i] for i in best_prerequisites]
 
-    # Return the course object of the best prerequisite
-    return [req[0] for req in best_prerequisite]
 
+class BranchScorer:
+    """
+    Scores prerequisite branches from one in-memory matrix of course embeddings.
 
-def score_branch(
-    cache_dir,
-    model,
-    course: Course,
-    course_ref_to_course,
-    max_enrollment,
-    branch: list[Course.Reference],
-    semantic_similarity_weight,
-    popularity_weight,
-):
-    if not branch:
-        return 0
-
-    course_embedding = get_embedding(cache_dir, model, course.get_full_summary())
-    branch_as_courses = [
-        course_ref_to_course[cr]
-        for cr in branch
-        if cr in course_ref_to_course
-        if cr != course.course_reference
-    ]
-    if not branch_as_courses:
-        return 0
-    branch_embeddings = [
-        get_embedding(cache_dir, model, course.get_full_summary())
-        for course in branch_as_courses
-    ]
-    branch_embedding = average_embedding(branch_embeddings)
+    A branch's score is the weighted cosine similarity between the course and
+    the mean embedding of the branch's courses, plus the weighted popularity of
+    the course. All branches of a course are scored in one numpy call.
+    """
 
-    # Calculate the cosine similarity between the course and the branch
-    similarity = cosine_similarity(course_embedding, branch_embedding)
+    def __init__(
+        self,
+        course_refs: list[Course.Reference],
+        embeddings: np.ndarray,
+        popularity: np.ndarray,
+        semantic_similarity_weight: float = 0.5,
+        popularity_weight: float = 0.5,
+    ):
+        """
+        Args:
+            course_refs: Course references, one per embedding row
+            embeddings: L2-normalized full summary embeddings of the courses
+            popularity: Enrollment of each course relative to the most enrolled course
+            semantic_similarity_weight: Weight of the semantic similarity
+            popularity_weight: Weight of the course popularity
+        """
+        self.index = {course_ref: i for i, course_ref in enumerate(course_refs)}
+        self.embeddings = embeddings
+        self.popularity = popularity
+        self.semantic_similarity_weight = semantic_similarity_weight
+        self.popularity_weight = popularity_weight
+
+    def similarities(
+        self, course: Course, course_refs: list[Course.Reference]
+    ) -> np.ndarray:
+        """
+        Cosine similarity between a course and each of the given courses.
 
-    enrollment_count = 0
-    if course.cumulative_grade_data:
-        enrollment_count = course.cumulative_grade_data.total
+        Args:
+            course: Course to compare against
+            course_refs: Course references, all in the scorer's index
 
-    enrollment_score = enrollment_count / max_enrollment
+        Returns:
+            Similarity of each course to the course
+        """
+        course_embedding = self.embeddings[self.index[course.course_reference]]
+        rows = self.embeddings[[self.index[cr] for cr in course_refs]]
+        norms = np.linalg.norm(rows, axis=1) * np.linalg.norm(course_embedding)
+        return (rows @ course_embedding) / np.maximum(norms, np.finfo(np.float32).tiny)
+
+    def score_branches(
+        self, course: Course, branches: list[list[Course.Reference]]
+    ) -> np.ndarray:
+        """
+        Score branches of prerequisites for a course.
 
-    score = (
-        semantic_similarity_weight * similarity + popularity_weight * enrollment_score
-    )
-    return score
+        Args:
+            course: Course the branches are prerequisites of
+            branches: Course references of each branch
+
+        Returns:
+            Score of each branch; 0 for branches without any other known course
+        """
+        course_idx = self.index[course.course_reference]
+
+        # Gather the known courses of each branch into a padded index matrix
+        member_indices = [
+            [
+                self.index[cr]
+                for cr in branch
+                if cr in self.index and cr != course.course_reference
+            ]
+            for branch in branches
+        ]
+        width = max((len(indices) for indices in member_indices), default=0)
+        padded = np.zeros((len(branches), max(width, 1)), dtype=np.int64)
+        mask = np.zeros(padded.shape, dtype=bool)
+        for row, indices in enumerate(member_indices):
+            padded[row, : len(indices)] = indices
+            mask[row, : len(indices)] = True
+
+        counts = mask.sum(axis=1)
+        sums = np.einsum("bm,bmd->bd", mask, self.embeddings[padded])
+        means = sums / np.maximum(counts, 1)[:, None]
+
+        # The course embedding is normalized, so only the branch mean needs its norm
+        norms = np.linalg.norm(means, axis=1)
+        similarity = (means @ self.embeddings[course_idx]) / np.maximum(
+            norms, np.finfo(np.float32).tiny
+        )
+
+        scores = (
+            self.semantic_similarity_weight * similarity
+            + self.popularity_weight * self.popularity[course_idx]
+        )
+        scores[counts == 0] = 0
+        return scores
 
 
 def prune_prerequisites(
-    cache_dir,
-    model,
     course: Course,
     course_ref_to_course,
-    max_enrollment,
+    branch_scorer: BranchScorer,
     max_prerequisites,
-):
+    beam_width=BRANCH_BEAM_WIDTH,
+) -> BranchSearchStats:
+    stats = BranchSearchStats()
+
     if len(course.prerequisites.course_references) <= max_prerequisites:
         logger.debug(
             f"Skipping optimization for {course.get_identifier()} as it has {len(course.prerequisites.course_references)} prerequisites"
         )
         course.optimized_prerequisites = course.prerequisites.course_references
-        return
-
-    branches = course.prerequisites.abstract_syntax_tree.course_combinations()
-    semantic_similarity_weight = 0.5
-    popularity_weight = 0.5
-    best_score = -1
-    best_branch = None
-    for branch in branches:
-        score = score_branch(
-            cache_dir=cache_dir,
-            model=model,
-            course=course,
-            course_ref_to_course=course_ref_to_course,
-            max_enrollment=max_enrollment,
-            branch=branch,
-            semantic_similarity_weight=semantic_similarity_weight,
-            popularity_weight=popularity_weight,
-        )
-        if score > best_score:
-            best_score = score
-            best_branch = branch
+        return stats
+
+    def score_branches(branches):
+        return branch_scorer.score_branches(course, branches).tolist()
+
+    # Best-first search over the requirement tree instead of scoring every branch
+    best_branches = course.prerequisites.abstract_syntax_tree.best_course_combinations(
+        score_branches, beam_width=beam_width, stats=stats
+    )
+    best_branch = best_branches[0][0] if best_branches else None
 
     course.optimized_prerequisites = best_branch
 
@@ -316,47 +805,99 @@ def prune_prerequisites(
             prerequisites.add(c)
 
         best = find_best_prerequisite(
-            cache_dir=cache_dir,
-            model=model,
             course=course,
             prerequisites=prerequisites,
+            branch_scorer=branch_scorer,
             max_prerequisites=max_prerequisites,
         )
 
         course.optimized_prerequisites = [c.course_reference for c in best]
 
+    return stats
+
+
+def course_popularity(course: Course, max_enrollment) -> np.float32:
+    """Enrollment of a course relative to the most enrolled course."""
+    if not course.cumulative_grade_data:
+        return np.float32(0)
+    return np.float32(course.cumulative_grade_data.total / max_enrollment)
+
+
+def optimization_key(
+    course: Course,
+    course_ref_to_course: dict[Course.Reference, Course],
+    max_enrollment,
+    max_prerequisites,
+    beam_width,
+    model,
+    reducer: EmbeddingReducer | None,
+) -> str:
+    """
+    Hash every input the optimized prerequisites of a course depend on.
+
+    These are the requisite text (which determines the requirement tree), the
+    full summaries of the course and of the courses it references (whose
+    embeddings are scored), the course's own popularity, the fitted embedding
+    reduction, and the optimization settings. Popularity of the other courses never reaches the branch scores,
+    so enrollment changes elsewhere do not invalidate the result.
+    """
+    involved = sorted(
+        set(course.prerequisites.course_references) | {course.course_reference},
+        key=lambda reference: reference.get_identifier(),
+    )
+
+    parts = [
+        get_model_name_for_cache(model),
+        course.get_identifier(),
+        course.prerequisites.prerequisites_text,
+        str(max_prerequisites),
+        str(beam_width),
+        reducer.digest() if reducer else "none",
+        repr(float(course_popularity(course, max_enrollment))),
+    ]
+    for reference in involved:
+        involved_course = course_ref_to_course.get(reference)
+        if involved_course is None:
+            parts.append(f"{reference.get_identifier()}:missing")
+            continue
+        summary = involved_course.get_full_summary()
+        parts.append(
+            f"{reference.get_identifier()}:{hashlib.sha256(summary.encode()).hexdigest()}"
+        )
+
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
 
 def optimize_prerequisite(
-    cache_dir,
     course,
-    model: SentenceTransformer,
     course_ref_to_course,
-    max_enrollment,
+    branch_scorer: BranchScorer,
     max_prerequisites,
-    max_retries,
-):
-    retries = 0
-    while retries < max_retries:
-        try:
-            prune_prerequisites(
-                cache_dir,
-                model,
-                course,
-                course_ref_to_course,
-                max_enrollment,
-                max_prerequisites,
-            )
-            return
-        except Exception as e:
-            retries += 1
-            logger.warning(
-                f"Retry {retries} for course {course.get_identifier()} failed: {e}"
-            )
-            if retries >= max_retries:
-                logger.error(
-                    f"Optimization for course {course.get_identifier()} failed completely."
-                )
-                return
+    beam_width=BRANCH_BEAM_WIDTH,
+) -> tuple[BranchSearchStats, str | None]:
+    """
+    Optimize the prerequisites of a course.
+
+    Scoring only reads the in-memory branch scorer, so an error is deterministic
+    for the same inputs. It is reported once and recorded instead of retried.
+
+    Returns:
+        Tuple of (branch search stats, error message or None)
+    """
+    try:
+        stats = prune_prerequisites(
+            course,
+            course_ref_to_course,
+            branch_scorer,
+            max_prerequisites,
+            beam_width,
+        )
+        return stats, None
+    except Exception as e:
+        logger.error(
+            f"Optimization for course {course.get_identifier()} failed: {type(e).__name__}: {e}"
+        )
+        return BranchSearchStats(), f"{type(e).__name__}: {e}"
 
 
 async def optimize_prerequisites(
@@ -364,30 +905,115 @@ async def optimize_prerequisites(
     model: SentenceTransformer,
     course_ref_to_course: dict[Course.Reference, Course],
     max_prerequisites: int | float,
-    max_retries: int,
+    beam_width: int = BRANCH_BEAM_WIDTH,
 ):
     total_courses = len(course_ref_to_course)
     logger.info(f"Optimizing prerequisites for {total_courses} courses...")
 
+    # Reuse the previous result (or recorded failure) of courses whose inputs are unchanged
+    previous_results = read_optimized_prerequisites_cache(cache_dir)
     max_enrollment = max(
-        c.cumulative_grade_data.total
-        for c in course_ref_to_course.values()
-        if c.cumulative_grade_data
+        (
+            c.cumulative_grade_data.total
+            for c in course_ref_to_course.values()
+            if c.cumulative_grade_data
+        ),
+        default=0,
     )
-
-    # Create tasks for each course and wait for them all to complete.
-    tasks = [
-        asyncio.to_thread(
-            optimize_prerequisite,
-            cache_dir,
+    reducer = get_embedding_reducer(cache_dir, model, course_ref_to_course)
+    results = {}
+    pending = []
+    reused_failures = 0
+    for course in course_ref_to_course.values():
+        identifier = course.get_identifier()
+        key = optimization_key(
             course,
-            model,
             course_ref_to_course,
             max_enrollment,
             max_prerequisites,
-            max_retries,
+            beam_width,
+            model,
+            reducer,
         )
-        for course in course_ref_to_course.values()
-    ]
-    await tqdm.gather(*tasks, desc="Optimizing Prerequisites", unit="course")
-    logger.info("Optimization completed.")
+        previous = previous_results.get(identifier)
+
+        if previous is None or previous["key"] != key:
+            pending.append((course, key))
+            continue
+
+        results[identifier] = previous
+        if previous["error"] is not None:
+            reused_failures += 1
+            logger.debug(
+                f"Skipping {identifier}, it failed before: {previous['error']}"
+            )
+        elif previous["optimized_prerequisites"] is not None:
+            course.optimized_prerequisites = [
+                Course.Reference.from_json(reference)
+                for reference in previous["optimized_prerequisites"]
+            ]
+        else:
+            course.optimized_prerequisites = None
+
+    logger.info(
+        f"{len(pending)} courses have new or changed inputs, {len(results)} reused "
+        f"from the previous run ({reused_failures} recorded failures)"
+    )
+
+    stats = BranchSearchStats()
+    if pending:
+        # One normalized embedding matrix and popularity vector for every branch score
+        course_refs = list(course_ref_to_course.keys())
+        embeddings = embed_texts(
+            cache_dir,
+            model,
+            [course_ref_to_course[ref].get_full_summary() for ref in course_refs],
+        )
+        if reducer:
+            embeddings = reducer.reduce(embeddings)
+        popularity = np.array(
+            [
+                course_popularity(course_ref_to_course[ref], max_enrollment)
+                for ref in course_refs
+            ],
+            dtype=np.float32,
+        )
+        branch_scorer = BranchScorer(course_refs, embeddings, popularity)
+
+        # Create tasks for each course and wait for them all to complete.
+        tasks = [
+            asyncio.to_thread(
+                optimize_prerequisite,
+                course,
+                course_ref_to_course,
+                branch_scorer,
+                max_prerequisites,
+                beam_width,
+            )
+            for course, _ in pending
+        ]
+        outcomes = await tqdm.gather(
+            *tasks, desc="Optimizing Prerequisites", unit="course"
+        )
+
+        for (course, key), (course_stats, error) in zip(pending, outcomes):
+            stats.merge(course_stats)
+
+            optimized = course.optimized_prerequisites
+            results[course.get_identifier()] = {
+                "key": key,
+                "optimized_prerequisites": [
+                    reference.to_dict() for reference in optimized
+                ]
+                if optimized is not None and error is None
+                else None,
+                "error": error,
+            }
+
+    write_optimized_prerequisites_cache(cache_dir, results)
+
+    logger.info(
+        f"Optimization completed. Branch search (beam width {beam_width}): "
+        f"{stats.explored} branches explored, {stats.pruned} pruned, "
+        f"{stats.memo_hits} memoized subtrees reused."
+    )
@@ -110,6 +110,27 @@ class EnrollmentData(JsonSerializable):
                 cls._all_locations[location_key] = new_location
                 return new_location
 
+        @classmethod
+        def building_coordinates(cls) -> dict[str | None, set[tuple[float, float]]]:
+            """
+            Get the coordinates of every meeting location seen so far, by building.
+
+            Returns:
+                Mapping of building name (None if unnamed) to the set of
+                (latitude, longitude) tuples with no missing components
+            """
+            building_coordinates = {}
+            for location in cls._all_locations.values():
+                if (
+                    location.coordinates
+                    and location.coordinates[0] is not None
+                    and location.coordinates[1] is not None
+                ):
+                    building_coordinates.setdefault(location.building, set()).add(
+                        location.coordinates
+                    )
+            return building_coordinates
+
         @classmethod
         def from_json(cls, data) -> "EnrollmentData.MeetingLocation":
             coordinates = data["coordinates"]
@@ -1,4 +1,5 @@
 import asyncio
+import importlib.util
 import logging
 import os
 import socket
@@ -14,7 +15,6 @@ from dotenv import load_dotenv
 from requests_cache import NEVER_EXPIRE
 from tqdm.contrib.logging import logging_redirect_tqdm
 
-from aggregate import aggregate_instructors, aggregate_courses
 from aio_cache import set_aio_cache_location, set_aio_cache_expiration
 from cache import (
     read_course_ref_to_course_cache,
@@ -34,19 +34,16 @@ from cache import (
     write_new_terms_cache,
     write_course_ref_to_meetings_cache,
     read_course_ref_to_meetings_cache,
+    read_building_lookup_cache,
+    write_building_lookup_cache,
+    read_building_name_cache,
+    write_building_name_cache,
 )
-from cytoscape import (
-    build_graphs,
-    cleanup_graphs,
-    generate_styles,
-    generate_style_from_graph,
-)
-from embeddings import optimize_prerequisites, get_model
-from enrollment import sync_enrollment_terms
-from instructors import get_ratings, gather_instructor_emails, scrape_rmp_api_key
-from madgrades import add_madgrades_data
-from save import write_data
-from webscrape import get_course_urls, scrape_all, build_subject_to_courses
+from enrollment_data import EnrollmentData
+
+# Step-specific modules (torch, sentence-transformers, scikit-learn, geopandas,
+# scrapers) are imported inside the step that needs them, so short steps don't
+# pay for the heavy imports.
 
 load_dotenv()
 
@@ -87,6 +84,18 @@ def generate_parser():
         help="Maximum number of prerequisites to keep for each course.",
         default=1,
     )
+    parser.add_argument(
+        "--branch_beam_width",
+        type=int,
+        help="Maximum number of prerequisite branches kept for any requirement subtree.",
+        default=64,
+    )
+    parser.add_argument(
+        "--embedding_backend",
+        choices=["torch", "onnx", "onnx-int8"],
+        help="Inference backend of the embedding models (ONNX needs the onnx extra).",
+        default=environ.get("EMBEDDING_BACKEND", "torch"),
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -109,6 +118,8 @@ def filter_step(step_name, allowed_step):
 
 
 def courses():
+    from webscrape import get_course_urls, scrape_all
+
     site_map_urls = get_course_urls()
     subject_to_full_subject, course_ref_to_course = asyncio.run(
         scrape_all(urls=site_map_urls)
@@ -120,6 +131,9 @@ def madgrades(
     course_ref_to_course,
     madgrades_api_key,
 ):
+    from enrollment import sync_enrollment_terms
+    from madgrades import add_madgrades_data
+
     terms = asyncio.run(
         add_madgrades_data(
             course_ref_to_course=course_ref_to_course,
@@ -138,6 +152,8 @@ def instructors(
     terms,
     cache_dir,
 ):
+    from instructors import get_ratings, gather_instructor_emails, scrape_rmp_api_key
+
     api_key = scrape_rmp_api_key()
     instructors_emails, course_ref_to_meetings = asyncio.run(
         gather_instructor_emails(terms=terms, course_ref_to_course=course_ref_to_course)
@@ -157,9 +173,14 @@ def optimize(
     cache_dir,
     course_ref_to_course,
     max_prerequisites,
+    branch_beam_width,
+    embedding_backend,
 ):
+    from embeddings import optimize_prerequisites, get_model
+
     model = get_model(
         cache_dir=cache_dir,
+        backend=embedding_backend,
     )
     asyncio.run(
         optimize_prerequisites(
@@ -167,7 +188,7 @@ def optimize(
             model=model,
             course_ref_to_course=course_ref_to_course,
             max_prerequisites=max_prerequisites,
-            max_retries=50,
+            beam_width=branch_beam_width,
         )
     )
 
@@ -176,6 +197,14 @@ def graph(
     course_ref_to_course,
     color_map,
 ):
+    from cytoscape import (
+        build_graphs,
+        cleanup_graphs,
+        generate_styles,
+        generate_style_from_graph,
+    )
+    from webscrape import build_subject_to_courses
+
     subject_to_courses = build_subject_to_courses(
         course_ref_to_course=course_ref_to_course
     )
@@ -205,6 +234,52 @@ def graph(
     )
 
 
+def building_lookup(cache_dir):
+    from building_loader import set_building_cache_location
+    from map import building_data_hash, resolve_building_names, warm_building_lookup
+
+    set_building_cache_location(path.join(cache_dir, "spatial"))
+
+    data_hash = building_data_hash()
+    building_coordinates = EnrollmentData.MeetingLocation.building_coordinates()
+
+    name_table = read_building_name_cache(cache_dir, data_hash)
+    name_table, added = resolve_building_names(name_table, building_coordinates)
+    logger.info(
+        f"Resolved {sum(osm_id is not None for osm_id in name_table.values())} of "
+        f"{len(name_table)} building names to OSM buildings ({added} new names)"
+    )
+
+    if added:
+        write_building_name_cache(cache_dir, data_hash, name_table)
+
+    lookup = read_building_lookup_cache(cache_dir, data_hash)
+    lookup, resolved = warm_building_lookup(lookup, building_coordinates, name_table)
+    logger.info(
+        f"Building lookup covers {len(lookup)} coordinates ({resolved} newly resolved)"
+    )
+
+    if resolved:
+        write_building_lookup_cache(cache_dir, data_hash, lookup)
+
+
+def check_embedding_backend(parser, backend):
+    """Exit early if an ONNX backend is selected without the onnx extra installed."""
+    if backend == "torch":
+        return
+
+    missing = [
+        module
+        for module in ("optimum", "onnxruntime")
+        if importlib.util.find_spec(module) is None
+    ]
+    if missing:
+        parser.error(
+            f"--embedding_backend {backend} needs {', '.join(missing)} from the onnx extra, "
+            f"install it with: uv sync --extra onnx"
+        )
+
+
 def raise_missing_env_var(var_name):
     raise ValueError(f"{var_name} environment variable is not set.")
 
@@ -233,6 +308,7 @@ logging.setLogRecordFactory(record_factory)
 def main():
     parser = generate_parser()
     args = parser.parse_args()
+    check_embedding_backend(parser, args.embedding_backend)
 
     data_dir = environ.get("DATA_DIR", None)
     if data_dir is None:
@@ -253,6 +329,8 @@ def main():
 
     step = str(args.step).lower()
     max_prerequisites = int(args.max_prerequisites)
+    branch_beam_width = int(args.branch_beam_width)
+    embedding_backend = str(args.embedding_backend)
     verbose = bool(args.verbose) or env_debug()
     no_build = bool(args.no_build)
 
@@ -320,8 +398,14 @@ def main():
             logger.info("Instructor data fetched successfully.")
 
         if filter_step(step, "aggregate"):
+            from aggregate import aggregate_instructors, aggregate_courses
+            from embeddings import prewarm_models
+
             logger.info("Aggregating data")
 
+            # Load the models while the caches are read and the statistics computed
+            prewarm_models(cache_dir, embedding_backend)
+
             course_ref_to_course = read_course_ref_to_course_cache(cache_dir)
             instructor_to_rating = read_instructors_to_rating_cache(cache_dir)
 
@@ -336,6 +420,7 @@ def main():
                 course_ref_to_course=course_ref_to_course,
                 instructors=instructor_values,
                 cache_dir=cache_dir,
+                embedding_backend=embedding_backend,
             )
 
             course_statistics = {
@@ -352,7 +437,10 @@ def main():
             logger.info("Data aggregated successfully.")
 
         if filter_step(step, "optimize"):
+            from embeddings import prewarm_models
+
             logger.info("Optimizing course data...")
+            prewarm_models(cache_dir, embedding_backend, keyword_model=False)
 
             course_ref_to_course = read_course_ref_to_course_cache(cache_dir)
 
@@ -360,6 +448,8 @@ def main():
                 cache_dir=cache_dir,
                 course_ref_to_course=course_ref_to_course,
                 max_prerequisites=max_prerequisites,
+                branch_beam_width=branch_beam_width,
+                embedding_backend=embedding_backend,
             )
 
             write_course_ref_to_course_cache(cache_dir, course_ref_to_course)
@@ -395,6 +485,8 @@ def main():
             logger.info("Course graph built successfully.")
 
         if not no_build:
+            from save import write_data
+
             subject_to_full_subject = read_subject_to_full_subject_cache(cache_dir)
             course_ref_to_course = read_course_ref_to_course_cache(cache_dir)
 
@@ -419,6 +511,7 @@ def main():
             explorer_stats = read_explorer_stats_cache(cache_dir)
 
             course_ref_to_meetings = read_course_ref_to_meetings_cache(cache_dir)
+            building_lookup(cache_dir)
 
             write_data(
                 data_dir=data_dir,
@@ -3,14 +3,18 @@ Refactored map module with clean separation of concerns.
 Main orchestrator for building and meeting data processing.
 """
 
-from typing import List, Dict, Tuple
+from os import environ
+from typing import Iterable, List, Dict, Set, Tuple, Union
 
 import geojson
+import numpy as np
 
-from building_aggregator import BuildingAggregator
-from building_loader import BuildingLoader
-from meeting_processor import MeetingProcessor
+from building_aggregator import BuildingAggregator, OccupancyCube
+from building_loader import get_building_loader
+from enrollment_data import EnrollmentData
+from meeting_processor import MeetingBatch, MeetingProcessor
 from spatial_query import SpatialQueryEngine
+from time_series_encoder import TimeSeriesEncoder
 
 
 class MapDataProcessor:
@@ -23,21 +27,45 @@ class MapDataProcessor:
     numbers may exceed actual unique student count.
     """
 
-    def __init__(self, chunk_duration_minutes: int = 5):
-        self.building_loader = BuildingLoader()
+    # Coarser resolutions derived from the base chunks, in minutes (None is a whole day)
+    PYRAMID_RESOLUTIONS = {"15m": 15, "hourly": 60, "daily": None}
+
+    # inline: every feature embeds its geometry; shared: features reference
+    # the geometry written once by shared_geometries
+    GEOMETRY_MODES = ("inline", "shared")
+
+    def __init__(
+        self,
+        chunk_duration_minutes: int = 5,
+        time_series_encoding: str = "dense",
+        geometry_mode: str = "inline",
+    ):
+        if geometry_mode not in self.GEOMETRY_MODES:
+            raise ValueError(
+                f"Unknown geometry mode {geometry_mode!r}, expected one of {self.GEOMETRY_MODES}"
+            )
+
+        self.building_loader = get_building_loader()
         self.meeting_processor = MeetingProcessor(chunk_duration_minutes)
-        self.spatial_engine = SpatialQueryEngine(self.building_loader.buildings)
-        self.building_aggregator = BuildingAggregator(self.building_loader.buildings)
+        self.spatial_engine = SpatialQueryEngine(building_loader=self.building_loader)
+        self.building_aggregator = BuildingAggregator(
+            building_loader=self.building_loader
+        )
+        self.time_series_encoder = TimeSeriesEncoder(time_series_encoding)
+        self.geometry_mode = geometry_mode
+        # Buildings referenced by shared geometry features so far
+        self._shared_buildings = set()
 
     def get_buildings(
-        self, meetings_data: List[Dict]
+        self, meetings_data: Union[List[EnrollmentData.Meeting], MeetingBatch]
     ) -> Tuple[geojson.FeatureCollection, Dict]:
         """
         Get buildings with person and instructor counts in 5-minute time chunks.
 
         Args:
-            meetings_data: List of meeting dictionaries with location.coordinates,
-                          current_enrollment, instructors, start_time, end_time
+            meetings_data: Meeting objects with location.coordinates,
+                          current_enrollment, instructors, start_time, end_time,
+                          or an already validated columnar MeetingBatch
 
         Returns:
             Tuple of (GeoJSON FeatureCollection with buildings, metadata dict)
@@ -47,57 +75,138 @@ class MapDataProcessor:
             meetings_data
         )
 
-        if not valid_meetings:
+        if not len(valid_meetings):
             return self._empty_response()
 
-        # Step 2: Process meetings into time-chunked coordinate data
-        coordinate_time_data, global_start, global_end, total_chunks = (
-            self.meeting_processor.process_meetings_to_coordinate_data(valid_meetings)
+        # Steps 2-4: Build the occupancy cube for a single window
+        occupancy_cube = self.build_occupancy_cube(valid_meetings, window_count=1)
+
+        # Steps 5-7: Features, totals and metadata
+        return self._window_response(occupancy_cube, 0)
+
+    def get_buildings_by_window(
+        self, meetings_by_window: List[List[EnrollmentData.Meeting]]
+    ) -> List[Tuple[geojson.FeatureCollection, Dict]]:
+        """
+        Get buildings with counts for many time windows (e.g. date buckets) at once.
+
+        Every window gives the same result as calling get_buildings with its
+        meetings, but validation, chunking, the spatial lookup and aggregation
+        run once over all windows and each window is sliced from the cube.
+
+        Args:
+            meetings_by_window: Meeting objects of each window
+
+        Returns:
+            List of (GeoJSON FeatureCollection with buildings, metadata dict),
+            one per window
+        """
+        meetings = []
+        windows = []
+        for window, window_meetings in enumerate(meetings_by_window):
+            meetings.extend(window_meetings)
+            windows.extend([window] * len(window_meetings))
+
+        # Step 1: Validate and filter meetings
+        valid_meetings = self.meeting_processor.validate_and_filter_meetings(
+            meetings, windows
         )
 
-        if not coordinate_time_data:
-            return self._empty_response_with_metadata(
-                total_chunks, global_start, global_end
-            )
+        if not len(valid_meetings):
+            return [self._empty_response() for _ in meetings_by_window]
 
-        # Step 3: Find buildings at meeting coordinates
-        coordinates_list = list(coordinate_time_data.keys())
-        buildings_geojson = self.spatial_engine.find_buildings_containing_points(
-            coordinates_list
+        # Steps 2-4: Build the occupancy cube for all windows in one pass
+        occupancy_cube = self.build_occupancy_cube(
+            valid_meetings, window_count=len(meetings_by_window)
         )
 
-        if not buildings_geojson.features:
-            return self._empty_response_with_metadata(
-                total_chunks, global_start, global_end
+        # Steps 5-7: Slice features, totals and metadata for each window
+        responses = []
+        for window in range(len(meetings_by_window)):
+            buildings_geojson, metadata = self._window_response(occupancy_cube, window)
+            if buildings_geojson.features:
+                metadata["pyramids"] = self._window_pyramids(occupancy_cube, window)
+            responses.append((buildings_geojson, metadata))
+
+        return responses
+
+    def build_occupancy_cube(
+        self, valid_meetings: MeetingBatch, window_count: int
+    ) -> OccupancyCube:
+        """
+        Build the building x time chunk occupancy cube for validated meetings.
+
+        Args:
+            valid_meetings: Batch of validated meetings
+            window_count: Number of time windows the meetings are bucketed into
+
+        Returns:
+            OccupancyCube covering every window
+        """
+        # Step 2: Process meetings into time-chunked coordinate data
+        coordinate_time_data, time_windows = (
+            self.meeting_processor.process_meetings_to_coordinate_data(
+                valid_meetings, window_count
             )
+        )
+
+        # Step 3: Find buildings containing each meeting coordinate
+        point_indices, building_indices = self.spatial_engine.find_point_buildings(
+            coordinate_time_data.coordinate_tuples()
+        )
 
         # Step 4: Aggregate coordinate data to building level
-        building_time_data = (
-            self.building_aggregator.aggregate_coordinate_data_to_buildings(
-                buildings_geojson, coordinate_time_data, total_chunks
-            )
+        return self.building_aggregator.aggregate_coordinate_data_to_buildings(
+            point_indices, building_indices, coordinate_time_data, time_windows
+        )
+
+    def _window_response(
+        self, occupancy_cube: OccupancyCube, window: int
+    ) -> Tuple[geojson.FeatureCollection, Dict]:
+        """Slice the buildings, totals and metadata of one window from the cube."""
+        time_windows = occupancy_cube.time_windows
+        total_chunks = int(time_windows.chunks[window])
+        start_time = int(time_windows.starts[window])
+        end_time = int(time_windows.ends[window])
+
+        if not total_chunks:
+            return self._empty_response()
+
+        buildings, building_persons, building_instructors = occupancy_cube.window(
+            window
         )
 
-        # Step 5: Clean properties and add time-chunked data
-        self.building_aggregator.clean_and_enhance_building_properties(
-            buildings_geojson, building_time_data, total_chunks
+        if not buildings:
+            return self._empty_response_with_metadata(
+                total_chunks, start_time, end_time
+            )
+
+        # Step 5: Build features from cached properties and buffered geometries
+        buildings_geojson = geojson.FeatureCollection(
+            self.building_aggregator.build_building_features(
+                buildings,
+                building_persons,
+                building_instructors,
+                self.time_series_encoder,
+                shared_geometry=self.geometry_mode == "shared",
+            )
         )
 
-        # Step 6: Expand building geometries for visualization
-        self.building_aggregator.expand_building_geometries(buildings_geojson)
+        if self.geometry_mode == "shared":
+            self._shared_buildings.update(buildings)
 
-        # Step 7: Calculate campus-wide totals
+        # Step 6: Calculate campus-wide totals
         total_persons_by_chunk, total_instructors_by_chunk, max_persons = (
             self.building_aggregator.calculate_campus_totals(
-                buildings_geojson, total_chunks
+                building_persons, building_instructors
             )
         )
 
-        # Step 8: Create comprehensive metadata
+        # Step 7: Create comprehensive metadata
         metadata = self._create_metadata(
             total_chunks,
-            global_start,
-            global_end,
+            start_time,
+            end_time,
             max_persons,
             total_persons_by_chunk,
             total_instructors_by_chunk,
@@ -105,6 +214,140 @@ class MapDataProcessor:
 
         return buildings_geojson, metadata
 
+    def _window_pyramids(self, occupancy_cube: OccupancyCube, window: int) -> Dict:
+        """
+        Derive the coarser resolutions of one window from the cube's prefix sums.
+
+        Values are the mean counts over each bucket, rounded to whole persons.
+        """
+        chunk_duration_ms = self.meeting_processor.chunk_duration_ms
+        start_time = int(occupancy_cube.time_windows.starts[window])
+
+        pyramids = {}
+        for resolution, minutes in self.PYRAMID_RESOLUTIONS.items():
+            if minutes is None:
+                chunks_per_bucket, origin = None, start_time
+            else:
+                # Buckets start on clock boundaries of the resolution (e.g. on the
+                # hour), so the first one may begin before the window's first meeting
+                chunks_per_bucket = max(
+                    1, minutes // self.meeting_processor.chunk_duration_minutes
+                )
+                bucket_ms = minutes * 60 * 1000
+                origin = start_time - start_time % bucket_ms
+            buildings, persons, instructors = occupancy_cube.window_buckets(
+                window,
+                chunks_per_bucket,
+                (start_time - origin) // chunk_duration_ms,
+            )
+
+            building_counts = {}
+            for building_id, counts in zip(
+                self.building_aggregator.building_ids(buildings), np.rint(persons)
+            ):
+                if building_id is not None:
+                    building_counts[building_id] = self.time_series_encoder.encode(
+                        counts
+                    )
+
+            pyramids[resolution] = {
+                "chunk_duration_minutes": minutes,
+                "start_time": start_time,
+                "bucket_origin": origin,
+                "total_chunks": persons.shape[1],
+                "buildings": building_counts,
+                "total_persons": self.time_series_encoder.encode(
+                    np.rint(persons.sum(axis=0))
+                ),
+                "total_instructors": self.time_series_encoder.encode(
+                    np.rint(instructors.sum(axis=0))
+                ),
+            }
+
+        return pyramids
+
+    def shared_geometries(self) -> geojson.FeatureCollection | None:
+        """
+        Get the geometry of every building referenced in shared geometry mode.
+
+        Returns:
+            GeoJSON FeatureCollection with the building properties and buffered
+            geometry, or None when features embed their own geometry
+        """
+        if self.geometry_mode != "shared":
+            return None
+
+        return geojson.FeatureCollection(
+            self.building_aggregator.build_geometry_features(
+                sorted(self._shared_buildings)
+            )
+        )
+
+    def building_data_hash(self) -> str:
+        """Hash of the building data and geometry options, for keying persisted lookups."""
+        return self.building_loader.data_hash
+
+    def resolve_building_names(
+        self, name_table: Dict[str, str | None], names: Iterable[str]
+    ) -> Tuple[Dict[str, str | None], int]:
+        """
+        Extend the building name to OSM @id table with any new names.
+
+        Args:
+            name_table: Previously persisted name table (may be empty)
+            names: Building names of meeting locations
+
+        Returns:
+            Tuple of (updated name table, number of names added)
+        """
+        new_names = {name for name in names if name and name not in name_table}
+        if not new_names:
+            return name_table, 0
+
+        return {
+            **name_table,
+            **self.spatial_engine.resolve_building_names(new_names),
+        }, len(new_names)
+
+    def warm_building_lookup(
+        self,
+        lookup: Dict[str, List[int]],
+        building_coordinates: Dict[str | None, Set[Tuple[float, float]]],
+        name_table: Dict[str, str | None],
+    ) -> Tuple[Dict[str, List[int]], int]:
+        """
+        Seed the coordinate to building lookup and resolve any new coordinates.
+
+        Coordinates of buildings whose name resolved are pointed at that
+        building directly; only the rest fall back to point-in-polygon queries.
+
+        Args:
+            lookup: Previously persisted lookup table (may be empty)
+            building_coordinates: Meeting coordinates as (latitude, longitude)
+                                  tuples, by building name
+            name_table: Building name to OSM @id table
+
+        Returns:
+            Tuple of (updated lookup table, number of newly resolved coordinates)
+        """
+        self.spatial_engine.load_point_cache(lookup)
+
+        named_coordinates = {}
+        for name, coordinates in building_coordinates.items():
+            osm_id = name_table.get(name) if name else None
+            if osm_id is None:
+                continue
+            for lat, lon in coordinates:
+                named_coordinates.setdefault((lon, lat), set()).add(osm_id)
+
+        resolved = self.spatial_engine.seed_point_cache(named_coordinates)
+        resolved += self.spatial_engine.precompute_point_cache(
+            (lon, lat)
+            for coordinates in building_coordinates.values()
+            for lat, lon in coordinates
+        )
+        return self.spatial_engine.export_point_cache(), resolved
+
     def _empty_response(self) -> Tuple[geojson.FeatureCollection, Dict]:
         """Return empty response with minimal metadata."""
         return geojson.FeatureCollection([]), {
@@ -113,8 +356,10 @@ class MapDataProcessor:
             "start_time": None,
             "end_time": None,
             "max_persons": 0,
-            "total_persons": [],
-            "total_instructors": [],
+            "total_persons": self.time_series_encoder.encode([]),
+            "total_instructors": self.time_series_encoder.encode([]),
+            "time_series_encoding": self.time_series_encoder.encoding,
+            "geometry_mode": self.geometry_mode,
         }
 
     def _empty_response_with_metadata(
@@ -127,8 +372,10 @@ class MapDataProcessor:
             "start_time": start_time,
             "end_time": end_time,
             "max_persons": 0,
-            "total_persons": [0] * total_chunks,
-            "total_instructors": [0] * total_chunks,
+            "total_persons": self.time_series_encoder.encode([0] * total_chunks),
+            "total_instructors": self.time_series_encoder.encode([0] * total_chunks),
+            "time_series_encoding": self.time_series_encoder.encoding,
+            "geometry_mode": self.geometry_mode,
         }
 
     def _create_metadata(
@@ -147,11 +394,22 @@ class MapDataProcessor:
             "start_time": start_time,
             "end_time": end_time,
             "max_persons": max_persons,
-            "total_persons": total_persons,
-            "total_instructors": total_instructors,
+            "total_persons": self.time_series_encoder.encode(total_persons),
+            "total_instructors": self.time_series_encoder.encode(total_instructors),
+            "time_series_encoding": self.time_series_encoder.encoding,
+            "geometry_mode": self.geometry_mode,
         }
 
 
 # Global instance for app.py usage
-_processor = MapDataProcessor()
+_processor = MapDataProcessor(
+    time_series_encoding=environ.get("MAP_TIME_SERIES_ENCODING", "dense"),
+    geometry_mode=environ.get("MAP_GEOMETRY_MODE", "inline"),
+)
 get_buildings = _processor.get_buildings
+get_buildings_by_window = _processor.get_buildings_by_window
+shared_geometries = _processor.shared_geometries
+building_data_hash = _processor.building_data_hash
+resolve_building_names = _processor.resolve_building_names
+warm_building_lookup = _processor.warm_building_lookup
+time_series_encoding = _processor.time_series_encoder.encoding
@@ -3,9 +3,97 @@ Meeting data processing module.
 Handles validation, filtering, and time-chunking of meeting data.
 """
 
-import math
-from collections import defaultdict
-from typing import List, Dict, Tuple
+from dataclasses import dataclass
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from enrollment_data import EnrollmentData
+
+
+@dataclass
+class MeetingBatch:
+    """Columnar view of meetings with valid coordinates and timing data."""
+
+    start_times: np.ndarray
+    """Meeting start times in epoch milliseconds."""
+
+    end_times: np.ndarray
+    """Meeting end times in epoch milliseconds."""
+
+    enrollments: np.ndarray
+    """Current enrollment of each meeting (missing values are 0)."""
+
+    instructor_counts: np.ndarray
+    """Number of instructors of each meeting."""
+
+    coordinates: np.ndarray
+    """Meeting coordinates shaped (meetings, 2) as (longitude, latitude)."""
+
+    windows: np.ndarray
+    """Time window (e.g. date bucket) index of each meeting."""
+
+    def __len__(self) -> int:
+        return len(self.start_times)
+
+
+@dataclass
+class CoordinateTimeData:
+    """Time-chunked person and instructor counts per unique coordinate."""
+
+    coordinates: np.ndarray
+    """Unique coordinates shaped (coordinates, 2) as (longitude, latitude)."""
+
+    persons: np.ndarray
+    """Person counts shaped (coordinates, chunks)."""
+
+    instructors: np.ndarray
+    """Instructor counts shaped (coordinates, chunks)."""
+
+    presence: np.ndarray
+    """Whether each coordinate has meetings in each window, shaped (coordinates, windows)."""
+
+    def __len__(self) -> int:
+        return len(self.coordinates)
+
+    def coordinate_tuples(self) -> List[Tuple[float, float]]:
+        """Get the coordinates as a list of (longitude, latitude) tuples."""
+        return [(lon, lat) for lon, lat in self.coordinates.tolist()]
+
+
+@dataclass
+class TimeWindows:
+    """
+    Time range of each window, laid out side by side on one chunk axis.
+
+    Every window keeps its own origin (its earliest meeting start), so the chunks
+    of window w are columns offsets[w]:offsets[w] + chunks[w] of a time series.
+    """
+
+    starts: np.ndarray
+    """Earliest meeting start of each window in epoch milliseconds."""
+
+    ends: np.ndarray
+    """Latest meeting end of each window in epoch milliseconds."""
+
+    chunks: np.ndarray
+    """Number of chunks of each window (0 for windows without meetings)."""
+
+    offsets: np.ndarray
+    """First column of each window on the shared chunk axis."""
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def total_chunks(self) -> int:
+        """Total number of chunks across all windows."""
+        return int(self.chunks.sum())
+
+    def columns(self, window: int) -> slice:
+        """Get the columns of a window on the shared chunk axis."""
+        offset = int(self.offsets[window])
+        return slice(offset, offset + int(self.chunks[window]))
 
 
 class MeetingProcessor:
@@ -15,154 +103,189 @@ class MeetingProcessor:
         self.chunk_duration_ms = chunk_duration_minutes * 60 * 1000
         self.chunk_duration_minutes = chunk_duration_minutes
 
-    def validate_and_filter_meetings(self, meetings_data: List[Dict]) -> List[Dict]:
+    def validate_and_filter_meetings(
+        self,
+        meetings_data: Union[List[EnrollmentData.Meeting], MeetingBatch],
+        windows: List[int] = None,
+    ) -> MeetingBatch:
         """
         Filter meetings to only those with valid coordinates and timing data.
 
         Args:
-            meetings_data: Raw meeting data
+            meetings_data: Meeting objects, or an already validated MeetingBatch
+            windows: Time window index of each meeting (defaults to a single window)
 
         Returns:
-            List of validated meetings with required fields
+            MeetingBatch with the fields required for time-chunking
         """
-        valid_meetings = []
+        if isinstance(meetings_data, MeetingBatch):
+            return meetings_data
+
+        if windows is None:
+            windows = [0] * len(meetings_data)
 
-        for meeting in meetings_data:
-            meeting = meeting.to_dict()  # TODO use native meeting
-            location = meeting.get("location")
+        start_times = []
+        end_times = []
+        enrollments = []
+        instructor_counts = []
+        coordinates = []
+        meeting_windows = []
+
+        for meeting, window in zip(meetings_data, windows):
+            location = meeting.location
             if not location:
                 continue
 
-            coordinates = location.get("coordinates", [])
+            location_coordinates = location.coordinates
             if (
-                not coordinates
-                or len(coordinates) != 2
-                or coordinates[0] is None
-                or coordinates[1] is None
+                not location_coordinates
+                or len(location_coordinates) != 2
+                or location_coordinates[0] is None
+                or location_coordinates[1] is None
             ):
                 continue
 
-            start_time = meeting.get("start_time")
-            end_time = meeting.get("end_time")
-            if start_time is None or end_time is None:
+            if meeting.start_time is None or meeting.end_time is None:
                 continue
 
-            valid_meetings.append(meeting)
-
-        return valid_meetings
-
-    def calculate_time_range(self, meetings: List[Dict]) -> Tuple[int, int, int]:
-        """
-        Calculate the global time range and number of chunks needed.
-
-        Args:
-            meetings: List of validated meetings
-
-        Returns:
-            Tuple of (start_time, end_time, total_chunks)
-        """
-        if not meetings:
-            return 0, 0, 0
-
-        all_start_times = [m["start_time"] for m in meetings]
-        all_end_times = [m["end_time"] for m in meetings]
-        global_start = min(all_start_times)
-        global_end = max(all_end_times)
+            # Locations store (latitude, longitude)
+            lat, lon = location_coordinates
 
-        total_chunks = max(
-            1, math.ceil((global_end - global_start) / self.chunk_duration_ms)
+            start_times.append(meeting.start_time)
+            end_times.append(meeting.end_time)
+            enrollments.append(meeting.current_enrollment or 0)
+            instructor_counts.append(
+                len(meeting.instructors) if meeting.instructors else 0
+            )
+            coordinates.append((lon, lat))
+            meeting_windows.append(window)
+
+        return MeetingBatch(
+            start_times=np.array(start_times, dtype=np.int64),
+            end_times=np.array(end_times, dtype=np.int64),
+            enrollments=np.array(enrollments, dtype=np.int64),
+            instructor_counts=np.array(instructor_counts, dtype=np.int64),
+            coordinates=np.array(coordinates, dtype=float).reshape(-1, 2),
+            windows=np.array(meeting_windows, dtype=np.int64),
         )
 
-        return global_start, global_end, total_chunks
-
-    def extract_meeting_data(
-        self, meeting: Dict
-    ) -> Tuple[int, int, Tuple[float, float]]:
+    def calculate_time_windows(
+        self, meetings: MeetingBatch, window_count: int
+    ) -> TimeWindows:
         """
-        Extract enrollment, instructor count, and coordinates from a meeting.
+        Calculate the time range and number of chunks of every window.
 
         Args:
-            meeting: Meeting dictionary
+            meetings: Batch of validated meetings
+            window_count: Number of time windows
 
         Returns:
-            Tuple of (enrollment, instructor_count, (lon, lat))
+            TimeWindows with each window's range and position on the chunk axis
         """
-        # Get enrollment
-        current_enrollment = meeting.get("current_enrollment", 0)
-        if current_enrollment is None:
-            current_enrollment = 0
+        starts = np.full(window_count, np.iinfo(np.int64).max, dtype=np.int64)
+        ends = np.full(window_count, np.iinfo(np.int64).min, dtype=np.int64)
+        np.minimum.at(starts, meetings.windows, meetings.start_times)
+        np.maximum.at(ends, meetings.windows, meetings.end_times)
 
-        # Get instructor count
-        instructors = meeting.get("instructors", [])
-        instructor_count = len(instructors) if instructors else 0
+        has_meetings = np.bincount(meetings.windows, minlength=window_count) > 0
+        starts[~has_meetings] = 0
+        ends[~has_meetings] = 0
 
-        # Get coordinates
-        coordinates = meeting.get("location", {}).get("coordinates", [])
-        lat, lon = coordinates[0], coordinates[1]
-        coord_key = (lon, lat)
+        # Ceiling division, with at least one chunk per window that has meetings
+        chunks = np.maximum(1, -((starts - ends) // self.chunk_duration_ms))
+        chunks[~has_meetings] = 0
 
-        return current_enrollment, instructor_count, coord_key
+        offsets = np.concatenate(([0], np.cumsum(chunks)[:-1])).astype(np.int64)
+
+        return TimeWindows(starts=starts, ends=ends, chunks=chunks, offsets=offsets)
 
     def calculate_time_chunks(
-        self, start_time: int, end_time: int, global_start: int, total_chunks: int
-    ) -> Tuple[int, int]:
+        self,
+        start_times: np.ndarray,
+        end_times: np.ndarray,
+        window_starts: np.ndarray,
+        window_chunks: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Calculate which time chunks a meeting spans.
+        Calculate which time chunks each meeting spans within its window.
 
         Args:
-            start_time: Meeting start time (ms)
-            end_time: Meeting end time (ms)
-            global_start: Global start time (ms)
-            total_chunks: Total number of chunks
+            start_times: Meeting start times (ms)
+            end_times: Meeting end times (ms)
+            window_starts: Start time of each meeting's window (ms)
+            window_chunks: Number of chunks of each meeting's window
 
         Returns:
-            Tuple of (start_chunk, end_chunk) indices
+            Tuple of (start_chunks, end_chunks) index arrays
         """
-        start_chunk = int((start_time - global_start) // self.chunk_duration_ms)
-        end_chunk = int((end_time - global_start) // self.chunk_duration_ms)
+        start_chunks = (start_times - window_starts) // self.chunk_duration_ms
+        end_chunks = (end_times - window_starts) // self.chunk_duration_ms
 
         # Ensure chunks are within bounds
-        start_chunk = max(0, min(start_chunk, total_chunks - 1))
-        end_chunk = max(0, min(end_chunk, total_chunks - 1))
+        start_chunks = np.clip(start_chunks, 0, window_chunks - 1)
+        end_chunks = np.clip(end_chunks, 0, window_chunks - 1)
 
-        return start_chunk, end_chunk
+        return start_chunks, end_chunks
 
     def process_meetings_to_coordinate_data(
-        self, meetings: List[Dict]
-    ) -> Tuple[Dict, int, int, int]:
+        self, meetings: MeetingBatch, window_count: int = 1
+    ) -> Tuple[CoordinateTimeData, TimeWindows]:
         """
-        Process meetings into time-chunked coordinate data.
+        Process meetings into time-chunked coordinate data for every window.
+
+        The chunks of all windows share one axis, so a whole term of date
+        buckets is chunked in a single pass. Each meeting adds its counts to a
+        difference array at its first chunk and subtracts them after its last
+        chunk; a cumulative sum then yields the per-chunk counts for every
+        coordinate.
 
         Args:
-            meetings: List of validated meetings
+            meetings: Batch of validated meetings
+            window_count: Number of time windows the meetings are bucketed into
 
         Returns:
-            Tuple of (coordinate_time_data, global_start, global_end, total_chunks)
+            Tuple of (coordinate_time_data, time_windows)
         """
-        global_start, global_end, total_chunks = self.calculate_time_range(meetings)
-
-        if total_chunks == 0:
-            return {}, 0, 0, 0
+        time_windows = self.calculate_time_windows(meetings, window_count)
+        total_chunks = time_windows.total_chunks
 
-        # Store data by coordinate and time chunk
-        coordinate_time_data = defaultdict(
-            lambda: {"persons": [0] * total_chunks, "instructors": [0] * total_chunks}
+        coordinates, coordinate_indices = np.unique(
+            meetings.coordinates, axis=0, return_inverse=True
         )
+        coordinate_indices = coordinate_indices.reshape(-1)
 
-        for meeting in meetings:
-            enrollment, instructor_count, coord_key = self.extract_meeting_data(meeting)
-            start_time = meeting.get("start_time")
-            end_time = meeting.get("end_time")
+        presence = np.zeros((len(coordinates), window_count), dtype=bool)
+        presence[coordinate_indices, meetings.windows] = True
 
-            start_chunk, end_chunk = self.calculate_time_chunks(
-                start_time, end_time, global_start, total_chunks
-            )
+        start_chunks, end_chunks = self.calculate_time_chunks(
+            meetings.start_times,
+            meetings.end_times,
+            time_windows.starts[meetings.windows],
+            time_windows.chunks[meetings.windows],
+        )
 
-            # Add counts to all chunks that this meeting spans
-            for chunk_idx in range(start_chunk, end_chunk + 1):
-                coordinate_time_data[coord_key]["persons"][chunk_idx] += enrollment
-                coordinate_time_data[coord_key]["instructors"][chunk_idx] += (
-                    instructor_count
-                )
+        # Meetings that end before they start span no chunks
+        spans = end_chunks >= start_chunks
+        rows = coordinate_indices[spans]
+        offsets = time_windows.offsets[meetings.windows[spans]]
+        starts = offsets + start_chunks[spans]
+        stops = offsets + end_chunks[spans] + 1
+
+        persons = np.zeros((len(coordinates), total_chunks + 1), dtype=np.int64)
+        instructors = np.zeros((len(coordinates), total_chunks + 1), dtype=np.int64)
+
+        enrollments = meetings.enrollments[spans]
+        instructor_counts = meetings.instructor_counts[spans]
+        np.add.at(persons, (rows, starts), enrollments)
+        np.add.at(persons, (rows, stops), -enrollments)
+        np.add.at(instructors, (rows, starts), instructor_counts)
+        np.add.at(instructors, (rows, stops), -instructor_counts)
+
+        coordinate_time_data = CoordinateTimeData(
+            coordinates=coordinates,
+            persons=np.cumsum(persons, axis=1)[:, :total_chunks],
+            instructors=np.cumsum(instructors, axis=1)[:, :total_chunks],
+            presence=presence,
+        )
 
-        return coordinate_time_data, global_start, global_end, total_chunks
+        return coordinate_time_data, time_windows
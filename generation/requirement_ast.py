@@ -1,5 +1,6 @@
 import re
-from typing import Union
+from dataclasses import dataclass
+from typing import Callable, Sequence, Union
 
 from json_serializable import JsonSerializable
 
@@ -321,6 +322,26 @@ def _tree_repr(
         return line
 
 
+@dataclass
+class BranchSearchStats:
+    """Counters of a best-first course combination search."""
+
+    explored: int = 0
+    """Distinct course combinations that were scored."""
+
+    pruned: int = 0
+    """Course combinations dropped because they fell outside the beam."""
+
+    memo_hits: int = 0
+    """Subtrees whose best combinations were reused from the memo."""
+
+    def merge(self, other: "BranchSearchStats") -> None:
+        """Add another search's counters to these."""
+        self.explored += other.explored
+        self.pruned += other.pruned
+        self.memo_hits += other.memo_hits
+
+
 class RequirementAbstractSyntaxTree(JsonSerializable):
     def __init__(self, root: Union[Node, Leaf]):
         self.root = root
@@ -388,6 +409,90 @@ class RequirementAbstractSyntaxTree(JsonSerializable):
                 unique.append(combo)
         return unique
 
+    def best_course_combinations(
+        self,
+        score_combinations: Callable[[list[list]], Sequence[float]],
+        beam_width: int = 64,
+        stats: BranchSearchStats | None = None,
+    ) -> list[tuple[list, float]]:
+        """
+        Best-first search for the highest scoring course combinations.
+
+        Unlike course_combinations, the Cartesian product of an AND is never
+        materialized: every subtree keeps only its beam_width best scoring
+        combinations, and an AND combines its children's beams one child at a
+        time. Identical subtrees are searched once.
+
+        Args:
+            score_combinations: Scores a batch of course combinations (higher is better)
+            beam_width: Maximum number of combinations kept for any subtree
+            stats: Counters to update with explored, pruned and memoized work
+
+        Returns:
+            Non-empty, distinct (combination, score) pairs, best first
+        """
+        if stats is None:
+            stats = BranchSearchStats()
+
+        scores = {}
+        memo = {}
+
+        def _combination_key(combo):
+            return tuple(sorted(combo, key=lambda cr: str(cr)))
+
+        def _keep_best(candidates):
+            # Dedupe (preserving order) and score only combinations not seen before
+            unique = {}
+            for combo in candidates:
+                unique.setdefault(_combination_key(combo), combo)
+
+            unscored = [key for key in unique if key not in scores]
+            if unscored:
+                new_scores = score_combinations([unique[key] for key in unscored])
+                scores.update(zip(unscored, new_scores))
+                stats.explored += len(unscored)
+
+            ranked = sorted(unique, key=lambda key: scores[key], reverse=True)
+            stats.pruned += max(0, len(ranked) - beam_width)
+            return [unique[key] for key in ranked[:beam_width]]
+
+        def _subtree_key(node):
+            if isinstance(node, Leaf):
+                return node.payload
+            return node.operator, tuple(_subtree_key(child) for child in node.children)
+
+        def _recurse(node):
+            key = _subtree_key(node)
+            if key in memo:
+                stats.memo_hits += 1
+                return memo[key]
+
+            if isinstance(node, Leaf):
+                # A TEXT leaf contributes no courses
+                best = [[]] if isinstance(node.payload, str) else [[node.payload]]
+
+            elif node.operator == "AND":
+                best = [[]]
+                for child in node.children:
+                    child_best = _recurse(child)
+                    best = _keep_best(
+                        [prev + curr for prev in best for curr in child_best]
+                    )
+
+            elif node.operator == "OR":
+                best = _keep_best(
+                    [combo for child in node.children for combo in _recurse(child)]
+                )
+
+            else:
+                raise ValueError(f"Unknown operator {node.operator!r}")
+
+            memo[key] = best
+            return best
+
+        best = _keep_best(_recurse(self.root))
+        return [(combo, scores[_combination_key(combo)]) for combo in best if combo]
+
 
 class RequirementParser:
     def __init__(self, tokens):
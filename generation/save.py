@@ -9,7 +9,6 @@ from tqdm import tqdm
 
 from instructors import FullInstructor
 from json_serializable import JsonSerializable
-from map import get_buildings
 from sanitization import sanitize_entry, sanitize_instructor_id
 from sitemap_generation import generate_sitemap
 
@@ -244,6 +243,9 @@ def write_meetings_by_date(meetings, data_dir, directory_tuple):
         - MM-DD-YY.geojson files with building highlights
         - index.json file with date mappings and statistics
     """
+    # Deferred so importing save (e.g. through cache) doesn't load geopandas
+    from map import get_buildings_by_window, time_series_encoding
+
     # Use US/Central timezone which automatically handles DST
     central_tz = ZoneInfo("US/Central")
 
@@ -294,16 +296,21 @@ def write_meetings_by_date(meetings, data_dir, directory_tuple):
     files_written = 0
     geojson_files_written = 0
 
-    for date_filename, meetings_for_date in tqdm(
-        date_meetings.items(), desc="Writing meeting files by date", unit="date"
+    # Build occupancy for all dates at once, each date is a slice of it
+    building_highlights = get_buildings_by_window(list(date_meetings.values()))
+    # Coarser occupancy resolutions of every date, written once per resolution
+    pyramids = defaultdict(dict)
+
+    for (date_filename, meetings_for_date), (building_geojson, metadata) in tqdm(
+        zip(date_meetings.items(), building_highlights),
+        total=len(date_meetings),
+        desc="Writing meeting files by date",
+        unit="date",
     ):
         # Write JSON file with meeting data
         write_file(data_dir, directory_tuple, date_filename, meetings_for_date)
         files_written += 1
 
-        # Generate building highlights for this date
-        building_geojson, metadata = get_buildings(meetings_for_date)
-
         full_geojson = {
             "type": "FeatureCollection",
             "features": building_geojson.features,
@@ -317,6 +324,8 @@ def write_meetings_by_date(meetings, data_dir, directory_tuple):
                 "end_time": metadata.get("end_time"),
                 "total_persons": metadata.get("total_persons", []),
                 "total_instructors": metadata.get("total_instructors", []),
+                "time_series_encoding": metadata.get("time_series_encoding", "dense"),
+                "geometry_mode": metadata.get("geometry_mode", "inline"),
             },
         }
 
@@ -326,6 +335,9 @@ def write_meetings_by_date(meetings, data_dir, directory_tuple):
         else:
             logger.warning(f"No building highlights generated for {date_filename}")
 
+        for resolution, pyramid in metadata.get("pyramids", {}).items():
+            pyramids[resolution][date_filename] = pyramid
+
     # Create index.json with date mappings and statistics
     index_data = {}
     for date_filename in date_meetings.keys():
@@ -339,6 +351,15 @@ def write_meetings_by_date(meetings, data_dir, directory_tuple):
     # Write index.json file
     write_file(data_dir, directory_tuple, "index", index_data)
 
+    # Write occupancy_<resolution>.json files for week and term views
+    for resolution, dates in pyramids.items():
+        write_file(
+            data_dir,
+            directory_tuple,
+            f"occupancy_{resolution}",
+            {"time_series_encoding": time_series_encoding, "dates": dates},
+        )
+
     logger.info(
         f"Wrote {files_written} meeting files organized by date to {'/'.join(directory_tuple)}"
     )
@@ -350,6 +371,28 @@ def write_meetings_by_date(meetings, data_dir, directory_tuple):
     )
 
 
+def write_building_geometries(data_dir):
+    """
+    Write the shared building geometries referenced by the map GeoJSON files.
+
+    In the shared geometry mode (MAP_GEOMETRY_MODE=shared), MM-DD-YY.geojson
+    features only carry @id and their time series; the properties and buffered
+    geometry of every building they reference are written once to
+    building_geometries.geojson. Nothing is written in the inline mode.
+    """
+    # Deferred so importing save (e.g. through cache) doesn't load geopandas
+    from map import shared_geometries
+
+    geometries = shared_geometries()
+    if geometries is None:
+        return
+
+    write_geojson_file(data_dir, tuple(), "building_geometries", geometries)
+    logger.info(
+        f"Wrote {len(geometries.features)} shared building geometries to building_geometries.geojson"
+    )
+
+
 def convert_keys_to_str(data):
     if isinstance(data, dict):
         return {str(key): convert_keys_to_str(value) for key, value in data.items()}
@@ -615,6 +658,9 @@ def write_data(
     # Chunk meetings purely by date
     chunk_meetings_by_date_only(course_ref_to_meetings, data_dir)
 
+    # Write building geometries referenced by the map files, if shared
+    write_building_geometries(data_dir)
+
     updated_on = datetime.now(timezone.utc).isoformat()
     updated_json = {
         "updated_on": updated_on,
@@ -0,0 +1,383 @@
+"""
+Blocked top-k similarity search over normalized embeddings.
+
+Similarities are computed one (row block x column block) tile at a time and
+merged into a running top-k per row, so memory stays bounded by the block size
+instead of growing with the square of the number of embeddings. Embeddings can
+optionally be projected to fewer dimensions first (EmbeddingReducer), which
+shrinks both the matrix products and the stored vectors.
+"""
+
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+@dataclass
+class TopKQuery:
+    """One top-k variant answered in the same pass over the similarity tiles."""
+
+    k: int
+    """Number of most similar embeddings to keep per row."""
+
+    candidate_mask: np.ndarray | None = None
+    """Boolean mask of the embeddings allowed as results (all when None)."""
+
+
+@dataclass
+class TopKResult:
+    """Top-k neighbours of every row, most similar first."""
+
+    indices: np.ndarray
+    """Neighbour indices shaped (rows, k), -1 where a row has fewer than k candidates."""
+
+    scores: np.ndarray
+    """Similarities shaped (rows, k), -inf where a row has fewer than k candidates."""
+
+
+def quantize(embeddings: np.ndarray, precision: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Store embeddings at a reduced precision.
+
+    Args:
+        embeddings: Float embeddings shaped (n, dimensions)
+        precision: float32, float16 or int8 (symmetric, one scale per row)
+
+    Returns:
+        Tuple of (stored embeddings, per-row scales to multiply back by)
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown similarity precision {precision!r}, expected one of {PRECISIONS}"
+        )
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.ones(len(embeddings), dtype=np.float32)
+
+    if precision == "float16":
+        return embeddings.astype(np.float16), scales
+    if precision == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127
+        scales[scales == 0] = 1
+        quantized = np.rint(embeddings / scales[:, None]).astype(np.int8)
+        return quantized, scales
+    return embeddings, scales
+
+
+def _dequantize(stored: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Expand a block of stored embeddings back to float32."""
+    return stored.astype(np.float32) * scales[:, None]
+
+
+def _merge_top_k(
+    top_scores: np.ndarray,
+    top_indices: np.ndarray,
+    scores: np.ndarray,
+    indices: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the k highest scores per row of the running top-k and a new tile.
+
+    Ties at the k-th score keep the lowest indices, so the result does not
+    depend on the order the columns were merged in.
+    """
+    candidate_scores = np.concatenate((top_scores, scores), axis=1)
+    candidate_indices = np.concatenate(
+        (top_indices, np.broadcast_to(indices, scores.shape)), axis=1
+    )
+
+    if candidate_scores.shape[1] > k:
+        kth_scores = np.partition(candidate_scores, -k, axis=1)[:, -k, None]
+        # Everything above the k-th score first, then ties by index
+        rank = np.where(
+            candidate_scores > kth_scores,
+            -1,
+            np.where(
+                candidate_scores == kth_scores,
+                candidate_indices,
+                np.iinfo(np.int64).max,
+            ),
+        )
+        keep = np.argpartition(rank, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+        candidate_indices = np.take_along_axis(candidate_indices, keep, axis=1)
+
+    return candidate_scores, candidate_indices
+
+
+def _sort_top_k(
+    top_scores: np.ndarray, top_indices: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Order a running top-k most similar first (ties by index), marking missing entries -1."""
+    order = np.lexsort((top_indices, -top_scores), axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    top_indices = np.take_along_axis(top_indices, order, axis=1)
+    top_indices[np.isneginf(top_scores)] = -1
+    return top_scores, top_indices
+
+
+def blocked_top_k(
+    embeddings: np.ndarray,
+    queries: dict[str, TopKQuery],
+    block_size: int = 1024,
+    precision: str = "float32",
+    exclude_self: bool = True,
+    rows: np.ndarray | None = None,
+    columns: np.ndarray | None = None,
+) -> dict[str, TopKResult]:
+    """
+    Find the most similar embeddings of every row for several top-k variants.
+
+    Each (row block x column block) tile of similarities is computed once and
+    shared by all queries; every query applies its candidate mask to the tile
+    and merges it into its running top-k, so no query ever holds more than a
+    tile and (rows, k) of state.
+
+    Args:
+        embeddings: L2-normalized embeddings shaped (n, dimensions), so the dot
+                    product is the cosine similarity
+        queries: Top-k variants by name
+        block_size: Rows and columns per tile
+        precision: Storage precision of the embeddings (float32, float16, int8)
+        exclude_self: Whether a row may be its own neighbour
+        rows: Indices of the rows to answer (all when None)
+        columns: Indices of the embeddings that may be neighbours (all when None)
+
+    Returns:
+        TopKResult for every query name, with one row per answered row
+    """
+    stored, scales = quantize(embeddings, precision)
+    n = len(stored)
+    rows = np.arange(n) if rows is None else np.asarray(rows, dtype=np.int64)
+    columns = np.arange(n) if columns is None else np.asarray(columns, dtype=np.int64)
+
+    results = {
+        name: TopKResult(
+            indices=np.full((len(rows), query.k), -1, dtype=np.int64),
+            scores=np.full((len(rows), query.k), -np.inf, dtype=np.float32),
+        )
+        for name, query in queries.items()
+    }
+
+    for row_start in range(0, len(rows), block_size):
+        row_stop = min(row_start + block_size, len(rows))
+        row_indices = rows[row_start:row_stop]
+        row_block = _dequantize(stored[row_indices], scales[row_indices])
+
+        running = {
+            name: (
+                np.full((len(row_block), 0), -np.inf, dtype=np.float32),
+                np.full((len(row_block), 0), -1, dtype=np.int64),
+            )
+            for name in queries
+        }
+
+        for column_start in range(0, len(columns), block_size):
+            column_indices = columns[column_start : column_start + block_size]
+            column_block = _dequantize(stored[column_indices], scales[column_indices])
+
+            tile = row_block @ column_block.T
+            if exclude_self:
+                tile[row_indices[:, None] == column_indices[None, :]] = -np.inf
+
+            for name, query in queries.items():
+                scores = tile
+                if query.candidate_mask is not None:
+                    allowed = query.candidate_mask[column_indices]
+                    scores = np.where(allowed[None, :], tile, -np.inf)
+
+                running[name] = _merge_top_k(
+                    *running[name], scores, column_indices, query.k
+                )
+
+        for name, (top_scores, top_indices) in running.items():
+            top_scores, top_indices = _sort_top_k(top_scores, top_indices)
+
+            width = top_scores.shape[1]
+            results[name].scores[row_start:row_stop, :width] = top_scores
+            results[name].indices[row_start:row_stop, :width] = top_indices
+
+    return results
+
+
+def update_top_k(
+    embeddings: np.ndarray,
+    query: TopKQuery,
+    previous: TopKResult,
+    changed: np.ndarray,
+    recompute: np.ndarray | None = None,
+    block_size: int = 1024,
+    precision: str = "float32",
+    exclude_self: bool = True,
+) -> tuple[TopKResult, int]:
+    """
+    Update a previous top-k after some embeddings changed.
+
+    Rows that changed, or that had a changed neighbour, are searched again in
+    full. Every other row can only gain neighbours among the changed rows, so
+    only its similarities to those are computed and merged into its previous
+    list. This matches a full blocked_top_k up to float rounding: those
+    similarities come from tiles of a different shape, whose products can
+    round differently in the last bit and so flip the tie-break between
+    equally similar rows.
+
+    Args:
+        embeddings: L2-normalized embeddings shaped (n, dimensions)
+        query: Top-k variant the previous result answered
+        previous: Previous top-k with indices mapped to the current rows
+        changed: Boolean mask of the rows that are new or whose embedding changed
+        recompute: Boolean mask of further rows to search in full (e.g. rows
+                   with a neighbour that no longer exists)
+        block_size: Rows and columns per tile
+        precision: Storage precision of the embeddings (float32, float16, int8)
+        exclude_self: Whether a row may be its own neighbour
+
+    Returns:
+        Tuple of (updated top-k, number of rows searched in full)
+    """
+    stale = changed.copy()
+    if recompute is not None:
+        stale |= recompute
+    stale |= (changed[previous.indices] & (previous.indices >= 0)).any(axis=1)
+
+    result = TopKResult(indices=previous.indices.copy(), scores=previous.scores.copy())
+
+    stale_rows = np.flatnonzero(stale)
+    if len(stale_rows):
+        full = blocked_top_k(
+            embeddings,
+            {"query": query},
+            block_size,
+            precision,
+            exclude_self,
+            rows=stale_rows,
+        )["query"]
+        result.indices[stale_rows] = full.indices
+        result.scores[stale_rows] = full.scores
+
+    fresh_rows = np.flatnonzero(~stale)
+    changed_columns = np.flatnonzero(changed)
+    if len(fresh_rows) and len(changed_columns):
+        gained = blocked_top_k(
+            embeddings,
+            {"query": query},
+            block_size,
+            precision,
+            exclude_self,
+            rows=fresh_rows,
+            columns=changed_columns,
+        )["query"]
+        # Missing entries are -inf and lose every merge, so their index doesn't matter
+        top_scores, top_indices = _merge_top_k(
+            result.scores[fresh_rows],
+            result.indices[fresh_rows],
+            gained.scores,
+            gained.indices,
+            query.k,
+        )
+        result.scores[fresh_rows], result.indices[fresh_rows] = _sort_top_k(
+            top_scores, top_indices
+        )
+
+    return result, len(stale_rows)
+
+
+REDUCTIONS = ("none", "pca", "random")
+
+
+@dataclass
+class EmbeddingReducer:
+    """Linear projection of embeddings to fewer dimensions (PCA or random)."""
+
+    method: str
+    """pca or random."""
+
+    mean: np.ndarray
+    """Mean subtracted before projecting, shaped (dimensions,); zeros for random."""
+
+    components: np.ndarray
+    """Projection matrix shaped (dimensions, reduced dimensions)."""
+
+    @classmethod
+    def fit(
+        cls, embeddings: np.ndarray, method: str, dimensions: int, seed: int = 0
+    ) -> "EmbeddingReducer":
+        """
+        Fit a projection to the given number of dimensions.
+
+        Args:
+            embeddings: Embeddings shaped (n, full dimensions) to fit on
+            method: pca (top principal components) or random (Gaussian projection)
+            dimensions: Number of reduced dimensions
+            seed: Seed of the random projection
+
+        Returns:
+            The fitted reducer
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        full_dimensions = embeddings.shape[1]
+        if dimensions > full_dimensions:
+            raise ValueError(
+                f"Cannot reduce {full_dimensions}-dim embeddings to {dimensions} dimensions"
+            )
+
+        if method == "pca":
+            if len(embeddings) < dimensions:
+                raise ValueError(
+                    f"PCA to {dimensions} dimensions needs at least {dimensions} embeddings, got {len(embeddings)}"
+                )
+            mean = embeddings.mean(axis=0)
+            centered = (embeddings - mean).astype(np.float64)
+            # Eigenvectors of the covariance, largest eigenvalues first
+            _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+            components = eigenvectors[:, ::-1][:, :dimensions]
+            return cls(method, mean, components.astype(np.float32))
+
+        if method == "random":
+            rng = np.random.default_rng(seed)
+            components = rng.standard_normal((full_dimensions, dimensions)) / np.sqrt(
+                dimensions
+            )
+            return cls(
+                method,
+                np.zeros(full_dimensions, dtype=np.float32),
+                components.astype(np.float32),
+            )
+
+        raise ValueError(
+            f"Unknown embedding reduction {method!r}, expected one of {REDUCTIONS}"
+        )
+
+    @property
+    def dimensions(self) -> int:
+        """Number of reduced dimensions."""
+        return self.components.shape[1]
+
+    def digest(self) -> str:
+        """Identify the fitted projection, for cache keys of results computed with it."""
+        sha256 = hashlib.sha256(self.method.encode())
+        sha256.update(np.ascontiguousarray(self.mean, dtype=np.float32).tobytes())
+        sha256.update(np.ascontiguousarray(self.components, dtype=np.float32).tobytes())
+        return f"{self.method}-{self.dimensions}-{sha256.hexdigest()}"
+
+    def reduce(self, embeddings: np.ndarray) -> np.ndarray:
+        """Project embeddings and L2-normalize them again, as float32."""
+        reduced = (
+            np.asarray(embeddings, dtype=np.float32) - self.mean
+        ) @ self.components
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def recall_at_k(expected: TopKResult, found: TopKResult) -> float:
+    """Mean fraction of each row's expected neighbours that were found."""
+    overlaps = [
+        len(set(wanted[wanted >= 0].tolist()) & set(got[got >= 0].tolist()))
+        / max((wanted >= 0).sum(), 1)
+        for wanted, got in zip(expected.indices, found.indices)
+    ]
+    return float(np.mean(overlaps)) if overlaps else 1.0
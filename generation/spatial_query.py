@@ -3,59 +3,227 @@ Spatial query module for building and coordinate operations.
 Handles point-in-polygon queries and building lookups.
 """
 
+import copy
+import re
+
 import geojson
-from shapely.geometry import Point
-from typing import List, Tuple, Dict, Set
-from building_loader import buildings_gdf
+import numpy as np
+import shapely
+from typing import Iterable, List, Tuple, Dict, Set
+from building_loader import BuildingLoader, get_building_loader
 
 
 class SpatialQueryEngine:
     """Handles spatial queries for buildings and coordinates."""
 
-    def __init__(self, buildings_data=None):
-        self.buildings_gdf = (
-            buildings_data if buildings_data is not None else buildings_gdf
-        )
+    # Decimal places kept for point cache keys (~1 cm at campus latitude)
+    COORDINATE_PRECISION = 7
+    # OSM tags matched against enroll API building names
+    OSM_NAME_FIELDS = ["name", "official_name", "alt_name", "short_name"]
+
+    def __init__(self, buildings_data=None, building_loader: BuildingLoader = None):
+        self._buildings_gdf = buildings_data
+        self.building_loader = building_loader or get_building_loader()
         self._point_cache: Dict[Tuple[float, float], Set[int]] = {}
+        self._features: List[geojson.Feature] | None = None
+
+    @property
+    def buildings_gdf(self):
+        """Get the buildings GeoDataFrame, loading it on first use."""
+        if self._buildings_gdf is None:
+            self._buildings_gdf = self.building_loader.buildings
+        return self._buildings_gdf
+
+    def _building_features(self) -> List[geojson.Feature]:
+        """
+        Get every building as a GeoJSON feature, serialized once and reused.
+
+        Returns:
+            Features in the same order as the buildings GeoDataFrame rows
+        """
+        if self._features is None:
+            buildings = self.buildings_gdf.copy()
+
+            # Handle timestamp/datetime columns that cause JSON serialization issues
+            for col in buildings.columns:
+                if "datetime" in str(buildings[col].dtype):
+                    buildings[col] = buildings[col].astype(str)
+
+            self._features = geojson.loads(buildings.to_json(drop_id=True)).features
+        return self._features
+
+    def _point_key(self, lon: float, lat: float) -> Tuple[float, float]:
+        """Round a coordinate to the precision used for point cache keys."""
+        return (
+            round(lon, self.COORDINATE_PRECISION),
+            round(lat, self.COORDINATE_PRECISION),
+        )
+
+    def load_point_cache(self, lookup: Dict[str, List[int]]) -> None:
+        """
+        Seed the point cache from a persisted lookup table.
+
+        Args:
+            lookup: Mapping of "lon,lat" keys to building indices
+        """
+        for key, indices in lookup.items():
+            lon, lat = (float(value) for value in key.split(","))
+            self._point_cache[self._point_key(lon, lat)] = set(indices)
+
+    def export_point_cache(self) -> Dict[str, List[int]]:
+        """
+        Export the point cache as a JSON-friendly lookup table.
+
+        Returns:
+            Mapping of "lon,lat" keys to sorted building indices
+        """
+        return {
+            f"{lon},{lat}": sorted(int(idx) for idx in indices)
+            for (lon, lat), indices in self._point_cache.items()
+        }
+
+    @staticmethod
+    def _normalize_building_name(name: str) -> str:
+        """Lowercase a building name and collapse punctuation and whitespace."""
+        return " ".join(re.sub(r"[^0-9a-z]+", " ", name.casefold()).split())
+
+    def resolve_building_names(self, names: Iterable[str]) -> Dict[str, str | None]:
+        """
+        Resolve enroll API building names to the OSM @id of the building they name.
+
+        A name resolves when, after normalization, it equals the name of exactly
+        one OSM building.
+
+        Args:
+            names: Building names
+
+        Returns:
+            Mapping of each name to its building's @id, or None if unresolved
+        """
+        osm_ids_by_name: Dict[str, Set[str]] = {}
+        name_fields = [
+            field for field in self.OSM_NAME_FIELDS if field in self.buildings_gdf
+        ]
+        for field in name_fields:
+            for osm_name, osm_id in zip(
+                self.buildings_gdf[field], self.buildings_gdf["@id"]
+            ):
+                if isinstance(osm_name, str) and isinstance(osm_id, str):
+                    osm_ids_by_name.setdefault(
+                        self._normalize_building_name(osm_name), set()
+                    ).add(osm_id)
+
+        resolved = {}
+        for name in names:
+            osm_ids = osm_ids_by_name.get(self._normalize_building_name(name), set())
+            resolved[name] = next(iter(osm_ids)) if len(osm_ids) == 1 else None
+        return resolved
 
-    def _find_buildings_for_coordinates_tuple(
-        self, coordinates_tuple: Tuple[Tuple[float, float], ...]
-    ) -> str:
+    def seed_point_cache(
+        self, coordinate_ids: Dict[Tuple[float, float], Set[str]]
+    ) -> int:
         """
-        Cached helper method for finding buildings containing coordinates.
-        Takes a tuple of coordinates for hashability.
+        Point coordinates straight at buildings by @id, bypassing point-in-polygon.
+
+        Args:
+            coordinate_ids: Mapping of (longitude, latitude) tuples to building @ids
+
+        Returns:
+            Number of coordinates whose cached buildings changed
         """
-        coordinates = list(coordinates_tuple)
-        # Convert coordinates to Shapely Points
-        points = [Point(lon, lat) for lon, lat in coordinates]
+        if "@id" in self.buildings_gdf:
+            index_by_id = {
+                osm_id: idx for idx, osm_id in enumerate(self.buildings_gdf["@id"])
+            }
+        else:
+            index_by_id = {}
 
-        matching_indices = set()
+        changed = 0
+        for (lon, lat), osm_ids in coordinate_ids.items():
+            indices = {
+                index_by_id[osm_id] for osm_id in osm_ids if osm_id in index_by_id
+            }
+            key = self._point_key(lon, lat)
+            if indices and self._point_cache.get(key) != indices:
+                self._point_cache[key] = indices
+                changed += 1
 
-        # Use spatial index for fast lookups with caching
-        for point in points:
-            point_coord = (point.x, point.y)
+        return changed
 
-            # Check cache first
-            if point_coord in self._point_cache:
-                matching_indices.update(self._point_cache[point_coord])
-            else:
-                # Get candidates using spatial index (fast bounding box check)
-                possible_matches_index = list(
-                    self.buildings_gdf.sindex.intersection(point.bounds)
-                )
+    def precompute_point_cache(self, coordinates: Iterable[Tuple[float, float]]) -> int:
+        """
+        Resolve every uncached coordinate to its buildings in one spatial query.
 
-                # Precise containment check for candidates
-                point_matches = set()
-                for idx in possible_matches_index:
-                    if self.buildings_gdf.geometry.iloc[idx].contains(point):
-                        point_matches.add(idx)
+        Args:
+            coordinates: Iterable of (longitude, latitude) tuples
 
-                # Cache the result for this point
-                self._point_cache[point_coord] = point_matches
-                matching_indices.update(point_matches)
+        Returns:
+            Number of coordinates that had to be resolved
+        """
+        missing = list(
+            {
+                self._point_key(lon, lat)
+                for lon, lat in coordinates
+                if self._point_key(lon, lat) not in self._point_cache
+            }
+        )
+        if not missing:
+            return 0
 
-        geojson_result = self._convert_buildings_to_geojson(matching_indices)
-        return geojson.dumps(geojson_result)
+        points = shapely.points(np.array(missing, dtype=float))
+        point_indices, building_indices = self.buildings_gdf.sindex.query(
+            points, predicate="within"
+        )
+
+        for key in missing:
+            self._point_cache[key] = set()
+        for point_idx, building_idx in zip(point_indices, building_indices):
+            self._point_cache[missing[point_idx]].add(int(building_idx))
+
+        return len(missing)
+
+    def find_point_buildings(
+        self, coordinates: Iterable[Tuple[float, float]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find which buildings contain each coordinate.
+
+        Args:
+            coordinates: Iterable of (longitude, latitude) tuples
+
+        Returns:
+            Tuple of (point_indices, building_indices) arrays, one entry per
+            coordinate/building containment pair
+        """
+        keys = [self._point_key(lon, lat) for lon, lat in coordinates]
+        self.precompute_point_cache(keys)
+
+        point_indices = []
+        building_indices = []
+        for point_idx, key in enumerate(keys):
+            for building_idx in self._point_cache[key]:
+                point_indices.append(point_idx)
+                building_indices.append(building_idx)
+
+        return (
+            np.array(point_indices, dtype=np.intp),
+            np.array(building_indices, dtype=np.intp),
+        )
+
+    def find_building_indices(
+        self, coordinates: Iterable[Tuple[float, float]]
+    ) -> List[int]:
+        """
+        Find the buildings that contain any of the given coordinates.
+
+        Args:
+            coordinates: Iterable of (longitude, latitude) tuples
+
+        Returns:
+            Sorted building DataFrame indices
+        """
+        _, building_indices = self.find_point_buildings(coordinates)
+        return sorted(set(building_indices.tolist()))
 
     def find_buildings_containing_points(
         self, coordinates: List[Tuple[float, float]]
@@ -69,10 +237,9 @@ class SpatialQueryEngine:
         Returns:
             GeoJSON FeatureCollection with matching buildings
         """
-        # Convert to tuple for hashability and use cached method
-        coordinates_tuple = tuple(coordinates)
-        geojson_str = self._find_buildings_for_coordinates_tuple(coordinates_tuple)
-        return geojson.loads(geojson_str)
+        return self._convert_buildings_to_geojson(
+            self.find_building_indices(coordinates)
+        )
 
     def find_building_at_coordinate(
         self, longitude: float, latitude: float
@@ -90,13 +257,13 @@ class SpatialQueryEngine:
         return self.find_buildings_containing_points([(longitude, latitude)])
 
     def _convert_buildings_to_geojson(
-        self, building_indices: set
+        self, building_indices: List[int]
     ) -> geojson.FeatureCollection:
         """
         Convert building indices to GeoJSON FeatureCollection.
 
         Args:
-            building_indices: Set of building DataFrame indices
+            building_indices: Building DataFrame indices
 
         Returns:
             GeoJSON FeatureCollection
@@ -104,15 +271,11 @@ class SpatialQueryEngine:
         if not building_indices:
             return geojson.FeatureCollection([])
 
-        matching_buildings = self.buildings_gdf.iloc[list(building_indices)].copy()
-
-        # Handle timestamp/datetime columns that cause JSON serialization issues
-        for col in matching_buildings.columns:
-            if "datetime" in str(matching_buildings[col].dtype):
-                matching_buildings[col] = matching_buildings[col].astype(str)
-
-        # Convert back to GeoJSON format
-        return geojson.loads(matching_buildings.to_json(drop_id=True))
+        # Shallow copies, so callers can replace properties and geometry in place
+        features = self._building_features()
+        return geojson.FeatureCollection(
+            [copy.copy(features[idx]) for idx in building_indices]
+        )
 
 
 _spatial_engine = SpatialQueryEngine()
@@ -0,0 +1,107 @@
+"""
+Time-series encoding module.
+Handles compact encodings of the time-chunked count arrays in occupancy GeoJSON.
+"""
+
+import base64
+from typing import Dict, List, Union
+
+import numpy as np
+
+
+class TimeSeriesEncoder:
+    """
+    Encodes time-chunked count arrays for occupancy GeoJSON output.
+
+    Encodings:
+        dense: Plain list with one integer per chunk (default).
+        rle: {"encoding": "rle", "length": n, "runs": [[start, length, value], ...]}
+             listing only the non-zero runs; every other chunk is zero.
+        base64: {"encoding": "base64", "length": n, "dtype": "uint16" | "uint32",
+                "data": "..."} holding the little-endian array, base64 encoded.
+                uint32 is only used when a value does not fit in uint16.
+    """
+
+    ENCODINGS = ("dense", "rle", "base64")
+
+    def __init__(self, encoding: str = "dense"):
+        if encoding not in self.ENCODINGS:
+            raise ValueError(
+                f"Unknown time series encoding {encoding!r}, expected one of {self.ENCODINGS}"
+            )
+        self.encoding = encoding
+
+    def encode(self, values: Union[np.ndarray, List[int]]) -> Union[List[int], Dict]:
+        """
+        Encode a time-chunked count array.
+
+        Args:
+            values: Non-negative integer counts, one per time chunk
+
+        Returns:
+            Dense list, or an encoded dictionary for the compact encodings
+        """
+        values = np.asarray(values, dtype=np.int64)
+
+        if self.encoding == "rle":
+            return self._encode_rle(values)
+        if self.encoding == "base64":
+            return self._encode_base64(values)
+        return values.tolist()
+
+    @staticmethod
+    def _encode_rle(values: np.ndarray) -> Dict:
+        """Encode the non-zero runs of equal values as [start, length, value]."""
+        if not len(values):
+            return {"encoding": "rle", "length": 0, "runs": []}
+
+        starts = np.flatnonzero(np.diff(values, prepend=values[0] - 1))
+        lengths = np.diff(starts, append=len(values))
+        run_values = values[starts]
+        non_zero = run_values != 0
+
+        runs = np.column_stack(
+            (starts[non_zero], lengths[non_zero], run_values[non_zero])
+        )
+        return {"encoding": "rle", "length": len(values), "runs": runs.tolist()}
+
+    @staticmethod
+    def _encode_base64(values: np.ndarray) -> Dict:
+        """Encode the array as little-endian unsigned integers in base64."""
+        fits_uint16 = not len(values) or values.max() <= np.iinfo(np.uint16).max
+        dtype = "uint16" if fits_uint16 else "uint32"
+        raw = values.astype("<u2" if fits_uint16 else "<u4").tobytes()
+
+        return {
+            "encoding": "base64",
+            "length": len(values),
+            "dtype": dtype,
+            "data": base64.b64encode(raw).decode("ascii"),
+        }
+
+    @staticmethod
+    def decode(encoded: Union[List[int], Dict]) -> List[int]:
+        """
+        Reference decoder, mirroring what clients of the GeoJSON must implement.
+
+        Args:
+            encoded: Dense list or encoded dictionary
+
+        Returns:
+            Dense list with one integer per time chunk
+        """
+        if isinstance(encoded, list):
+            return encoded
+
+        if encoded["encoding"] == "rle":
+            values = np.zeros(encoded["length"], dtype=np.int64)
+            for start, length, value in encoded["runs"]:
+                values[start : start + length] = value
+            return values.tolist()
+
+        if encoded["encoding"] == "base64":
+            dtype = "<u2" if encoded["dtype"] == "uint16" else "<u4"
+            raw = base64.b64decode(encoded["data"])
+            return np.frombuffer(raw, dtype=dtype).astype(np.int64).tolist()
+
+        raise ValueError(f"Unknown time series encoding {encoded['encoding']!r}")